@@ -0,0 +1,86 @@
+import os
+import random
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORY_CONTENT_DIR = os.path.join(BASE_DIR, "story_content")
+
+EBOOK_WORD_COUNTS = (10_000, 50_000, 100_000)
+QUICK_WORD_COUNTS = (10_000,)
+SEED = 1234  # fixed, so every run benchmarks the same text
+
+# Letters each script's pseudo-words are built from. CJK "words" are runs of
+# characters without spaces between them, like real Chinese/Japanese text.
+SCRIPTS = {
+    "latin": ("abcdefghijklmnopqrstuvwxyzéè", " "),
+    "cyrillic": ("абвгдежзийклмнопрстуфхцчшщыэюя", " "),
+    "devanagari": ("कखगघचछजझटठडढणतथदधनपफबभमयरलवशसह" + "ािीुूेैोौं", " "),
+    "arabic": ("ابتثجحخدذرزسشصضطظعغفقكلمنهوي", " "),
+    "cjk": ("的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明社长", ""),
+}
+
+
+def load_story_content() -> list:
+    """[(name, markdown)] for every finished story in story_content/."""
+    stories = []
+    for name in sorted(os.listdir(STORY_CONTENT_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(STORY_CONTENT_DIR, name), 'r', encoding='utf-8') as f:
+                stories.append((name[:-4], f.read()))
+    return stories
+
+
+def _words(rng: random.Random, letters: str, count: int) -> list:
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(2, 8))) for _ in range(count)]
+
+
+def generate_ebook(words: int, script: str = "latin", seed: int = SEED) -> str:
+    """
+    Builds a deterministic ebook in the shape the ebook prompt asks Gemini
+    for: a bold title, an italic summary, chapter and section headings,
+    paragraphs with bold/italic runs, and bullet lists.
+    """
+    rng = random.Random(f"{seed}-{script}-{words}")
+    letters, separator = SCRIPTS[script]
+
+    def sentence(length: int) -> str:
+        parts = _words(rng, letters, length)
+        if separator and rng.random() < 0.3:
+            i = rng.randrange(len(parts))
+            parts[i] = f"**{parts[i]}**" if rng.random() < 0.5 else f"*{parts[i]}*"
+        return separator.join(parts)
+
+    lines = [f"**{sentence(4)}**", "", f"*{sentence(30)}*", ""]
+    written, chapter = 0, 0
+    while written < words:
+        chapter += 1
+        lines += [f"# {chapter}. {sentence(5)}", ""]
+        for section in range(rng.randint(2, 4)):
+            lines += [f"## {chapter}.{section + 1} {sentence(4)}", ""]
+            for _ in range(rng.randint(3, 6)):
+                length = rng.randint(40, 120)
+                lines += [sentence(length) + ("." if separator else "。"), ""]
+                written += length
+            if rng.random() < 0.5:
+                items = rng.randint(3, 6)
+                lines += [f"* {sentence(8)}" for _ in range(items)] + [""]
+                written += items * 8
+            if written >= words:
+                break
+    return "\n".join(lines)
+
+
+def generated_ebooks(word_counts: tuple = EBOOK_WORD_COUNTS, scripts=None) -> list:
+    """[(name, markdown)] for every script and word count."""
+    return [(f"ebook_{script}_{words // 1000}k", generate_ebook(words, script))
+            for script in (scripts or SCRIPTS) for words in word_counts]
+
+
+def generation_outputs(stories: list) -> list:
+    """Raw model outputs in both shapes split_title_and_body handles."""
+    outputs = []
+    for name, markdown in stories:
+        title, _, body = markdown.strip().partition("\n")
+        title = title.strip("*# ")
+        outputs.append((f"{name}/labelled", f"Title: {title}\n\nStory: {body.strip()}"))
+        outputs.append((f"{name}/plain", f"{title}\n\n{body.strip()}"))
+    return outputs
@@ -0,0 +1,239 @@
+"""
+Microbenchmarks for the CPU-heavy pure functions: markdown parsing, title/body
+splitting, the TXT/DOCX/PDF exporters and generate_pdf.py.
+
+    python benchmarks/run_benchmarks.py                  # run, compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # run and make this the baseline
+    python benchmarks/run_benchmarks.py --quick --only pdf
+
+Each case reports the best and median wall time, peak memory (tracemalloc)
+and output size. Baselines are machine specific and kept locally in
+benchmarks/results/; a case whose time, peak memory or output size grows
+past the threshold is reported as a regression and the run exits with 1.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from corpus import load_story_content, generated_ebooks, generation_outputs, EBOOK_WORD_COUNTS, QUICK_WORD_COUNTS  # noqa: E402
+from document_model import parse_markdown, split_title_and_body  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+LATEST_PATH = os.path.join(RESULTS_DIR, "latest.json")
+DEFAULT_THRESHOLD = 0.25  # relative growth reported as a regression
+MIN_TIME_DELTA = 0.002    # seconds; smaller differences are timer noise
+MIN_MEMORY_DELTA = 64 * 1024
+
+
+# --- Benchmarked functions ---
+# Each takes its prepared input (corpus text, or the parsed Document for the
+# exporters) and a scratch directory and returns what it produced; the
+# benchmark's size function turns that into bytes outside the timed call.
+def bench_parse_markdown(text: str, scratch: str):
+    return parse_markdown(text)
+
+
+def bench_split_title_and_body(text: str, scratch: str) -> tuple:
+    return split_title_and_body(text)
+
+
+def bench_create_txt(document, scratch: str) -> str:
+    from exporters import create_txt
+    path = os.path.join(scratch, "out.txt")
+    create_txt(document, path)
+    return path
+
+
+def bench_create_docx(document, scratch: str) -> str:
+    from exporters import create_docx
+    path = os.path.join(scratch, "out.docx")
+    create_docx(document, path)
+    return path
+
+
+def bench_create_pdf(document, scratch: str) -> str:
+    from exporters import create_pdf
+    path = os.path.join(scratch, "out.pdf")
+    create_pdf(document, path)
+    return path
+
+
+def _write_chapters(text: str, scratch: str) -> list:
+    """Splits a corpus text at its top-level headings into chapter files."""
+    chapters = [chunk for chunk in re.split(r'(?m)^# ', text) if chunk.strip()]
+    files = []
+    for i, chapter in enumerate(chapters):
+        title, _, body = chapter.partition("\n")
+        path = os.path.join(scratch, f"chapter_{i}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        files.append((path, title.strip("*# ") or f"Chapter {i + 1}"))
+    return files
+
+
+def bench_create_chapter_pdf(text: str, scratch: str) -> str:
+    import generate_pdf
+    source = os.path.join(scratch, "chapter.txt")
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write(text)
+    path = os.path.join(scratch, "chapter.pdf")
+    with contextlib.redirect_stdout(io.StringIO()):  # it prints a line per PDF
+        generate_pdf.create_chapter_pdf(source, path, "Benchmark Chapter")
+    return path
+
+
+def bench_create_multi_page_pdf(text: str, scratch: str) -> str:
+    import generate_pdf
+    path = os.path.join(scratch, "book.pdf")
+    chapters = _write_chapters(text, scratch)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_pdf.create_multi_page_pdf(chapters, path)
+    return path
+
+
+# --- Output sizes (untimed) ---
+def _document_size(document) -> int:
+    return len(json.dumps(document.to_dict(), ensure_ascii=False).encode('utf-8'))
+
+
+def _split_size(result: tuple) -> int:
+    title, body = result
+    return len(title.encode('utf-8')) + len(body.encode('utf-8'))
+
+
+# name -> (function, output size, corpus key, input preparation (untimed), required modules)
+BENCHMARKS = {
+    "parse_markdown": (bench_parse_markdown, _document_size, "documents", None, ()),
+    "split_title_and_body": (bench_split_title_and_body, _split_size, "generations", None, ()),
+    "create_txt": (bench_create_txt, os.path.getsize, "documents", parse_markdown, ()),
+    "create_docx": (bench_create_docx, os.path.getsize, "documents", parse_markdown, ("docx",)),
+    "create_pdf": (bench_create_pdf, os.path.getsize, "documents", parse_markdown, ("reportlab",)),
+    "create_chapter_pdf": (bench_create_chapter_pdf, os.path.getsize, "documents", None, ("reportlab",)),
+    "create_multi_page_pdf": (bench_create_multi_page_pdf, os.path.getsize, "ebooks", None, ("reportlab",)),
+}
+
+
+# --- Runner ---
+def build_corpus(word_counts: tuple) -> dict:
+    stories = load_story_content()
+    ebooks = generated_ebooks(word_counts)
+    return {
+        "documents": stories + ebooks,
+        "generations": generation_outputs(stories + ebooks),
+        "ebooks": ebooks,
+    }
+
+
+def measure(function, size_of, data, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        size = size_of(function(data, scratch))  # warm-up: imports, font registration, caches
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(data, scratch)
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            function(data, scratch)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"time_min": min(times), "time_median": statistics.median(times), "peak_memory": peak,
+            "output_size": size}
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Names the metrics of one case that grew past the threshold."""
+    regressions = []
+    for metric, floor in (("time_min", MIN_TIME_DELTA), ("peak_memory", MIN_MEMORY_DELTA), ("output_size", 0)):
+        before, after = baseline.get(metric), result[metric]
+        if before and after - before > max(before * threshold, floor):
+            regressions.append(f"{metric} {after / before - 1:+.0%}")
+    return regressions
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--only", help="regular expression selecting benchmark/case names")
+    parser.add_argument("--quick", action="store_true", help=f"only the {QUICK_WORD_COUNTS[0] // 1000}k-word ebooks")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (default: 3)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"relative growth reported as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    only = re.compile(args.only) if args.only else None
+    corpus = build_corpus(QUICK_WORD_COUNTS if args.quick else EBOOK_WORD_COUNTS)
+    stored = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            stored = json.load(f).get("results", {})
+    baseline = {} if args.save_baseline else stored
+
+    results, regressions = {}, {}
+    print(f"{'case':<58} {'best':>9} {'median':>9} {'peak mem':>10} {'output':>10}")
+    for name, (function, size_of, corpus_key, prepare, requires) in BENCHMARKS.items():
+        missing = [module for module in requires if importlib.util.find_spec(module) is None]
+        if missing:
+            print(f"{name:<58} skipped, {', '.join(missing)} not installed")
+            continue
+        for case, text in corpus[corpus_key]:
+            key = f"{name}/{case}"
+            if only and not only.search(key):
+                continue
+            result = measure(function, size_of, prepare(text) if prepare else text, args.repeat)
+            results[key] = result
+            line = (f"{key:<58} {result['time_min'] * 1000:7.1f}ms {result['time_median'] * 1000:7.1f}ms "
+                    f"{_format_bytes(result['peak_memory']):>10} {_format_bytes(result['output_size']):>10}")
+            if key in baseline:
+                regressed = compare(result, baseline[key], args.threshold)
+                if regressed:
+                    regressions[key] = regressed
+                    line += "  REGRESSION: " + ", ".join(regressed)
+            print(line, flush=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    run = {"created": time.time(), "python": platform.python_version(), "machine": platform.machine(),
+           "repeat": args.repeat, "results": results}
+    with open(LATEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=1)
+    if args.save_baseline:
+        # Cases not run this time (--only, --quick) keep their old baseline
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({**run, "results": {**stored, **results}}, f, indent=1)
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+    elif not baseline:
+        print("\nNo baseline yet; run with --save-baseline to record one")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}:")
+        for key, regressed in regressions.items():
+            print(f"  {key}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
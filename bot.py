@@ -1,45 +1,54 @@
 import logging
 import os
 import sys
+from startup_profile import profile # First, so the profile clock starts with the process
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup,
-WebAppInfo
+WebAppInfo, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters,
 ContextTypes, CallbackQueryHandler
 from telegram.error import Conflict
+from telegram.ext import TypeHandler
+profile.mark("imported telegram")
  # Add the script's directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
  # Import all necessary API keys from config.py
-from config import TELEGRAM_BOT_TOKEN, GEMINI_API_KEY, PLAYHT_API_KEY
+from config import TELEGRAM_BOT_TOKEN, PLAYHT_API_KEY
 import io
 import requests # Import requests for API calls
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.enums import TA_CENTER
-from docx import Document
+import exporters
+from document_model import parse_markdown, split_title_and_body
+from exporters import create_pdf, create_docx, create_txt
+from webapp_protocol import parse_job, WebAppJobError
+from story_library import library
+from play_sessions import CAPACITY, IDLE, play_sessions
+from job_journal import job_journal
+from send_scheduler import SendScheduler
+from update_processor import UserOrderedUpdateProcessor
 import asyncio
+import signal
 import re
- # Configure logging
-logging.basicConfig(
-format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-level=logging.INFO
-)
+ # Configure logging (queued, written by a background thread)
+from log_pipeline import setup_logging, log_fields
+setup_logging()
 logger = logging.getLogger(__name__)
- import google.generativeai as genai
  # --- AI Model Integration ---
-genai.configure(api_key=GEMINI_API_KEY)
- def generate_story_with_ai(prompt: str, full_markdown_mode: bool = False) ->
+# google.generativeai is imported by the router on first use or by the warm-up
+from model_router import router as model_router
+from workers import NUM_WORKERS, run_ingress
+from content_store import content_store
+profile.mark("imported bot modules")
+ async def generate_story_with_ai(prompt: str, full_markdown_mode: bool = False, mode: str
+= "story") ->
 tuple[str | None, str | None]:
 """
-Generates a story based on the prompt using Gemini Flash.
+Generates a story based on the prompt using the Gemini model routed for `mode`.
 If full_markdown_mode is True, expects the AI to return the complete markdown
 story. based  """
 try:
-model = genai.GenerativeModel('gemini-1.5-flash')
 if full_markdown_mode:
 # In full markdown mode, send the exact prompt and expect the full story back
-response = model.generate_content(prompt,
-generation_config=genai.types.GenerationConfig(
+response = await model_router.generate_content(mode, prompt,
+generation_config=model_router.generation_config(
 candidate_count=1,
 max_output_tokens=2000,
 temperature=0.7
@@ -48,30 +57,19 @@ full_text = response.text.strip()
 return None, full_text # Return None for title, as full_text is the complete story
 else:
 # Original behavior: generate title and body separately
-response = model.generate_content(f"Generate a story with a title and body
+response = await model_router.generate_content(mode, f"Generate a story with a title and body
 on the following prompt: {prompt}\n\nTitle:",
-generation_config=genai.types.GenerationConfig(
+generation_config=model_router.generation_config(
 candidate_count=1,
 max_output_tokens=2000,
 temperature=0.7
 ))
 full_text = response.text.strip()
-if "Title:" in full_text and "Story:" in full_text:
-parts = full_text.split("Story:", 1)
-title_line = parts[0].replace("Title:", "").strip()
-story_body = parts[1].strip()
-title = title_line.split('\n')[0].strip()
-elif "\n\n" in full_text:
-lines = full_text.split('\n\n', 1)
-title = lines[0].strip()
-story_body = lines[1].strip()
-else:
-title = "Generated Story"
-story_body = full_text
+title, story_body = split_title_and_body(full_text)
 return title, story_body
 except Exception as e:
 logger.error(f"Error generating story with Gemini: {e}")
-return None, None def generate_ebook_with_ai(topic: str, language: str = "en") -> str:
+return None, None async def generate_ebook_with_ai(topic: str, language: str = "en") -> str:
 """
 Generates educational material based on the topic using Gemini Flash.
 """
@@ -93,24 +91,26 @@ Format in Markdown.
 - Optionally use emoji section breaks like 🌌, 🚀, 🪐
  Respond only with the final ebook in Markdown. Do not include instructions, tags, or
 notes.'''
-  _, ebook_content = retry_story_generation(ebook_prompt, 1,
-full_markdown_mode=True)
+  _, ebook_content = await retry_story_generation(ebook_prompt, 1,
+full_markdown_mode=True, mode="ebook")
 return ebook_content if ebook_content else "**Error Generating
 Ebook**\n\n_Could not generate the ebook. Please try again with a different topic._"
- def retry_story_generation(prompt: str, attempt: int, full_markdown_mode: bool =
-False) -> tuple[str | None, str | None]:
+ async def retry_story_generation(prompt: str, attempt: int, full_markdown_mode: bool =
+False, mode: str = "story") -> tuple[str | None, str | None]:
 """
 Retries story generation. This function now directly calls generate_story_with_ai
 without rephrasing, as the core generation function is expected to be robust.
 """
-logger.info(f"Attempting AI generation (attempt {attempt}) with prompt:
-{prompt}, full_markdown_mode: {full_markdown_mode}")
-title, story_body = generate_story_with_ai(prompt, full_markdown_mode)
+logger.info("Attempting AI generation (attempt %d), full_markdown_mode: %s", attempt,
+full_markdown_mode, extra={'mode': mode, 'prompt': prompt, 'sample': True})
+title, story_body = await generate_story_with_ai(prompt, full_markdown_mode, mode)
 if (title and story_body) or (full_markdown_mode and story_body):
+logger.info("AI generation succeeded (attempt %d)", attempt,
+extra={'mode': mode, 'response': story_body, 'sample': True})
 return title, story_body
 elif attempt < 3: # Allow a few retries in case of initial failure from
 generate_story_with_ai
-return retry_story_generation(prompt, attempt + 1, full_markdown_mode)
+return await retry_story_generation(prompt, attempt + 1, full_markdown_mode, mode)
 else:
 if full_markdown_mode:
 return None, "**Error Generating Story**\n\n_Could not generate the story.
@@ -118,53 +118,27 @@ Please try again with a different prompt._"
 else:
 return "A Mysterious Tale", "Once upon a time, a story unfolded that defied all
 expectations. The end."
- # --- PDF/DOCX/TXT Export Functions ---
-def create_pdf(content: str, filename: str):
-doc = SimpleDocTemplate(filename, pagesize=letter)
-styles = getSampleStyleSheet()
-  title_style = styles['h1']
-title_style.alignment = TA_CENTER
-body_style = styles['Normal']
-  elements = []
-lines = content.split('\n')
-  # Attempt to extract title from markdown (bolded or heading)
-extracted_title = "Generated Document"
-content_start_index = 0
-  # Check for bolded title (e.g., **Title**)
-title_match_bold = re.match(r'^\s*#*\s*\*\*(.*?)\*\*', lines[0], re.MULTILINE)
-if title_match_bold:
-extracted_title = title_match_bold.group(1).strip()
-content_start_index = 1 # Skip the title line
-else:
-# Check for heading title (e.g., # Title)
-title_match_heading = re.match(r'^\s*#+\s*(.*?)\s*$', lines[0], re.MULTILINE)
-if title_match_heading:
-extracted_title = title_match_heading.group(1).strip()
-content_start_index = 1 # Skip the title line
-  elements.append(Paragraph(extracted_title, title_style))elements.append(Spacer(1, 0.2 * 100))
-  for line in lines[content_start_index:]:
-if line.strip():
-# Convert markdown bold/italic to HTML bold/italic for ReportLab
-line = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', line) # Bold
-line = re.sub(r'\_(.*?)\_', r'<i>\1</i>', line) # Italic
-  # Handle chapters/sections as bold
-if line.startswith("Chapter") or line.startswith("Introduction") or
-line.startswith("Conclusion"):
-elements.append(Paragraph(f"<b>{line}</b>", body_style))
-else:
-elements.append(Paragraph(line, body_style))
-elements.append(Spacer(1, 0.1 * 100))
-else:
-elements.append(Spacer(1, 0.1 * 100))
-  doc.build(elements)
- def create_docx(content: str, filename: str):
-document = Document()
-document.add_paragraph(content)
-document.save(filename)
- def create_txt(content: str, filename: str):
-with open(filename, 'w', encoding='utf-8') as f:
-f.write(content)
- # --- Telegram Bot Command Handlers ---
+ # --- Generated Content Storage ---
+def store_last_content(context: ContextTypes.DEFAULT_TYPE, body: str, content_type: str,
+title: str | None = None, language: str | None = None) -> None:
+"""
+Parses the generated markdown once and keeps only a small handle in user_data;
+the parsed document lives in the memory-bounded content store and is fetched
+lazily on download. The title is taken from the markdown
+unless one is given; the generation language picks the PDF font.
+"""
+document = parse_markdown(body, title=title, default_title=f"Generated
+{content_type.replace('_', ' ').title()}")
+previous = context.user_data.get('last_content')
+if previous and previous.get('handle'):
+content_store.delete(previous['handle'])
+context.user_data['last_content'] = {
+'title': document.title,
+'handle': content_store.put(document),
+'type': content_type,
+'language': language
+}
+  # --- Telegram Bot Command Handlers ---
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) 
 > None:
 # --- WebApp Button Integration ---
@@ -208,7 +182,9 @@ generation assistant! 📘\n\n"
 "📊 /progress - Check your book usage count, quota remaining, and total stories
 \n"
 "❓ /help - Get a smart guide on how to use each feature.\n"
-"🎮 /play - Enter gamified creative mode!\n\n"
+"🎮 /play - Enter gamified creative mode!\n"
+"🚀 /webapp - Set up a whole request in the WebApp in one go.\n"
+"📚 /library - Browse and search ready-made stories, delivered instantly.\n\n"
 "Let's make magic! What story shall we create today? ✨"
 )
 await update.effective_message.reply_text(welcome_message,
@@ -272,6 +248,8 @@ await send_language_selection(update, context,
 await send_language_selection(update, context,
 'waiting_for_writer_language_selection')
  # --- Play.ht API Integration ---
+# One session for all Play.ht calls, so connections are reused
+http_session = requests.Session()
 def generate_audio_with_playht(text: str, voice_id: str) -> str | None:
 """
 Generates audio from text using Play.ht API.
@@ -290,13 +268,13 @@ payload = {
 "output_format": "mp3",
 "quality": "medium" # Example quality setting
 try:
-response = requests.post(url, headers=headers, json=payload)
+response = http_session.post(url, headers=headers, json=payload)
 response.raise_for_status() # Raise an exception for HTTP errors
   # Play.ht API returns a JSON with 'audioUrl' or 'url'
 response_json = response.json()
 audio_url = response_json.get('audioUrl') or response_json.get('url')
 if audio_url:
-audio_response = requests.get(audio_url)
+audio_response = http_session.get(audio_url)
 audio_response.raise_for_status()
 audio_data = audio_response.content
 audio_filename = f"generated_audio_{voice_id}_{hash(text)}.mp3"
@@ -390,18 +368,96 @@ await update.effective_message.reply_text("🎮 Welcome to the Gamified Creative
 Mode! What kind of game or interactive story would you like to play? (e.g., 'a mystery
 riddle', 'a choose-your-own-adventure start', 'a quick trivia game') 🚀")
 context.user_data['state'] = 'waiting_for_play_prompt'
+ async def library_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
+-> None:
+# Pre-built stories are served straight from story_content/ and story_pdfs/,
+# no generation or rendering needed
+query_text = " ".join(context.args) if context.args else ""
+if query_text:
+entries = library.search(query_text)
+if not entries:
+await update.effective_message.reply_text(f"No library stories match
+\"{query_text}\". Try /library to browse everything! 📚")
+return
+header = f"📚 Library results for \"{query_text}\":"
+else:
+series = library.list_series()
+entries = [entry for _, series_entries in series for entry in series_entries]
+header = "📚 PROXORA Library – ready to read instantly:\n\n" + "\n".join(
+f"• {series_title} ({len(series_entries)} part{'s' if len(series_entries) > 1 else ''})"
+for series_title, series_entries in series)
+  keyboard = [[InlineKeyboardButton(f"{'📄' if entry.pdf_path else '📖'} {entry.title}",
+callback_data=f'library_{entry.key}')] for entry in entries]
+reply_markup = InlineKeyboardMarkup(keyboard)
+await update.effective_message.reply_text(header + "\n\nSearch with /library <keywords>.",
+reply_markup=reply_markup)
+ async def webapp_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
+-> None:
+# Jobs are sent back with sendData, which only works for WebApps opened from a
+# keyboard button (not an inline one)
+keyboard = [[KeyboardButton("🚀 Create with PROXORA WebApp",
+web_app=WebAppInfo(url="https://jigsawhere.github.io/PROXORA/"))]]
+reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+await update.effective_message.reply_text("Open the WebApp below to set up your whole
+story, ebook or voice request in one go! 🚀", reply_markup=reply_markup)
+ async def endplay_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
+-> None:
+if play_sessions.end(update.effective_user.id):
+await update.effective_message.reply_text("🎮 Game over! Thanks for playing. Start a
+new adventure any time with /play.")
+else:
+await update.effective_message.reply_text("You don't have a game running. Start one
+with /play! 🎮")
+if context.user_data.get('state') == 'in_play_session':
+context.user_data['state'] = None
+ async def summarize_play_history(prompt: str) -> str | None:
+"""Generates the rolling summary used to compact long /play sessions."""
+_, summary = await generate_story_with_ai(prompt, full_markdown_mode=True, mode="play")
+return summary
  # --- WebApp Data Handler ---
 async def handle_webapp_data(update: Update, context:
 ContextTypes.DEFAULT_TYPE):
-if update.effective_message.web_app_data:
-data = update.effective_message.web_app_data.data
-await update.effective_message.reply_text(f"✅ Data received from WebApp:
-`{data}`", parse_mode='Markdown')
-else:
+if not update.effective_message.web_app_data:
 await update.effective_message.reply_text("No data received from WebApp.")
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
--> None:
-user_text = update.effective_message.text
+return
+try:
+job = parse_job(update.effective_message.web_app_data.data,
+set(SUPPORTED_LANGUAGES.values()))
+except WebAppJobError as e:
+await update.effective_message.reply_text(f"Sorry, the WebApp request was invalid:
+{e}. Please try again.")
+return
+  # Set the same state the button flow would have reached, then run the job
+# directly through the regular message path
+context.user_data.update(job.user_data())
+await handle_message(update, context, user_text=job.prompt)
+ # user_data needed to re-run a message job after a restart
+JOB_USER_DATA_KEYS = ('state', 'selected_language', 'story_length', 'writer_tone',
+'tts_voice', 'tts_age')
+ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE,
+user_text: str | None = None) -> None:
+"""
+Journals the request so it survives a restart, then runs it. While the bot
+is draining for a shutdown, requests are journaled but not started; the chat
+gets a resume button once the bot is back.
+"""
+user_text = user_text or update.effective_message.text
+chat_id = update.effective_message.chat_id
+with log_fields(user=update.effective_user.id, language=context.user_data.get('selected_language')):
+if context.user_data.get('state') == 'waiting_for_tts_age': # Quick reply, nothing to journal
+await run_message_job(update, context, user_text)
+return
+payload = {'text': user_text, 'user_data': {key: context.user_data.get(key) for key in
+JOB_USER_DATA_KEYS}}
+if job_journal.draining:
+job_journal.accept('message', chat_id, update.effective_user.id, payload)
+await update.effective_message.reply_text("PROXORA is restarting for an update. I've
+saved your request and will send you a button to resume it as soon as I'm back! ⏳")
+return
+async with job_journal.track('message', chat_id, update.effective_user.id, payload):
+await run_message_job(update, context, user_text)
+ async def run_message_job(update: Update, context: ContextTypes.DEFAULT_TYPE,
+user_text: str) -> None:
 chat_id = update.effective_message.chat_id
 state = context.user_data.get('state')
   title, body = None, None
@@ -439,7 +495,7 @@ short story in {selected_language}.
 - Optionally use emoji section breaks like 🌌, 🚀, 🪐
  Respond only with the final story in Markdown. Do not include instructions, tags, or
 notes.'''
-  _, story_markdown = retry_story_generation(full_prompt, 1,
+  _, story_markdown = await retry_story_generation(full_prompt, 1,
 full_markdown_mode=True)
   if story_markdown:
 # Truncate if too long for direct message, but always offer download
@@ -452,23 +508,8 @@ parse_mode='Markdown')
 else:
 await update.effective_message.reply_text(story_markdown,
 parse_mode='Markdown')
-  # Store the full markdown for download
-# Extract title and body from markdown for consistent storage
-title_match = re.match(r'^\s*#*\s*\*\*(.*?)\*\*', story_markdown,
-re.MULTILINE)
-summary_match = re.match(r'^\s*\_(.*?)\_', story_markdown, re.MULTILINE)
-  extracted_title = title_match.group(1).strip() if title_match else "Generated
-Story"
-# For body, remove title and summary lines, then clean up
-extracted_body = story_markdown
-if title_match:
-extracted_body = extracted_body[title_match.end():].strip()
-if summary_match:
-extracted_body = extracted_body[summary_match.end():].strip()
-  context.user_data['last_content'] = {'title': extracted_title,
-'body': story_markdown, # Store full markdown for PDF
-generation
-'type': content_type}
+  # Store the full markdown (parsed once) for download
+store_last_content(context, story_markdown, content_type, language=selected_language)
   keyboard = [
 [
 InlineKeyboardButton("📄 📥 Download PDF",
@@ -504,24 +545,17 @@ return # Exit early as this path handles its own response and state reset
   elif state == 'waiting_for_story_prompt':
 await update.effective_message.reply_text(f"Generating a story in
 {selected_language.upper()} about: {user_text}... Please wait! ⏳")
-title, body = retry_story_generation(f"Generate a story in {selected_language}
+title, body = await retry_story_generation(f"Generate a story in {selected_language}
 about: {user_text}", 1)content_type = "story"
   elif state == 'waiting_for_ebook_topic':
 await update.effective_message.reply_text(f"Generating an ebook in
 {selected_language.upper()} about: {user_text}... Please wait! ⏳")
-ebook_content = generate_ebook_with_ai(user_text, selected_language) # Pass
+ebook_content = await generate_ebook_with_ai(user_text, selected_language) # Pass
 language to ebook generation
   if ebook_content and not ebook_content.startswith("**Error Generating
 Ebook**"):
-# Extract title from markdown for storage
-title_match = re.match(r'^\s*#*\s*\*\*(.*?)\*\*', ebook_content, re.MULTILINE)
-extracted_title = title_match.group(1).strip() if title_match else "Generated
-Ebook"
-  context.user_data['last_content'] = {
-'title': extracted_title,
-'body': ebook_content, # Store full markdown for PDF generation
-'type': "ebook" # Set content type to ebook
-}
+  store_last_content(context, ebook_content, "ebook", language=selected_language) # Store full markdown (parsed once) for
+download
   # Send a truncated message and offer download
 display_text = ebook_content[:1900] + "\n\n...[Ebook continues in
 download]..." if len(ebook_content) > 2000 else ebook_content
@@ -559,8 +593,8 @@ tone = context.user_data.get('writer_tone')
 selected_language = context.user_data.get('selected_language', 'en')
 await update.effective_message.reply_text(f"Generating a {tone} story in
 {selected_language.upper()} about: {user_text}... Please wait! ⏳")
-title, body = retry_story_generation(f"Generate a story in {selected_language}
-with a {tone} tone about: {user_text}", 1)
+title, body = await retry_story_generation(f"Generate a story in {selected_language}
+with a {tone} tone about: {user_text}", 1, mode="writer")
 content_type = "writer_story"
 if 'selected_language' in context.user_data:
 del context.user_data['selected_language']
@@ -634,7 +668,7 @@ following text, subtly or directly incorporating the concept of 'Slow Toxin' and
 ensuring the tone is appropriate for a {tts_voice} voice of approximately {tts_age if
 tts_age else 'an unspecified'} age: {user_text}"
   gemini_response_title, gemini_response_body =
-retry_story_generation(gemini_prompt_for_tts, 1)
+await retry_story_generation(gemini_prompt_for_tts, 1, mode="tts")
   if gemini_response_body:
 audio_file_path = generate_audio_with_playht(gemini_response_body,
 voice_id)
@@ -670,16 +704,17 @@ game_prompt = f'''Generate an interactive game or creative challenge in
 - Format in Markdown.
  Respond only with the game/challenge content in Markdown. Do not include
 instructions, tags, or notes.'''
-  _, game_content = retry_story_generation(game_prompt, 1,
-full_markdown_mode=True)
+  _, game_content = await retry_story_generation(game_prompt, 1,
+full_markdown_mode=True, mode="play")
   if game_content:
 await update.effective_message.reply_text(game_content,
 parse_mode='Markdown')
-context.user_data['last_content'] = {
-'title': "Gamified Creative Mode",
-'body': game_content,
-'type': "game"
-}
+store_last_content(context, game_content, "game", title="Gamified Creative Mode",
+language=selected_language)
+# Keep the game going: the next messages are moves in this session
+session = play_sessions.start(update.effective_user.id, selected_language, user_text)
+await play_sessions.record_turn(session, user_text, game_content, summarize_play_history)
+context.user_data['state'] = 'in_play_session'
 keyboard = [
 [
 InlineKeyboardButton("📚 Want more? Try /story, /writer, or /play",
@@ -690,20 +725,47 @@ InlineKeyboardButton("🎁 Invite a friend with /refer to earn bonus
 credits!", callback_data='null')
 ]
 ]reply_markup = InlineKeyboardMarkup(keyboard)
-await update.effective_message.reply_text("What's your next move? Or try
-another command!", reply_markup=reply_markup)
+await update.effective_message.reply_text("What's your next move? Just reply
+to keep playing, or use /endplay to stop.", reply_markup=reply_markup)
 else:
 await update.effective_message.reply_text("Sorry, I couldn't generate a
 gamified experience for that. Please try a different prompt.")
-  context.user_data['state'] = None
-if 'selected_language' in context.user_data:
+context.user_data['state'] = None
+  if 'selected_language' in context.user_data:
 del context.user_data['selected_language']
 return # Exit early as this path handles its own response and state reset
+  elif state == 'in_play_session':
+session = play_sessions.get(update.effective_user.id)
+if not session:
+context.user_data['state'] = None
+reason = play_sessions.end_reason(update.effective_user.id)
+if reason == CAPACITY:
+message = "Your game session was closed because too many games are running right now. Start a new one with /play! 🎮"
+elif reason == IDLE:
+message = "Your game session has ended after being idle. Start a new one with /play! 🎮"
+else:
+message = "Your game session has ended. Start a new one with /play! 🎮"
+await update.effective_message.reply_text(message)
+return
+  # The prompt holds a rolling summary plus the last few turns, so it stays the
+# same size however long the game runs
+game_prompt = play_sessions.build_prompt(session, user_text)
+_, game_content = await generate_story_with_ai(game_prompt, full_markdown_mode=True,
+mode="play")
+if game_content:
+await update.effective_message.reply_text(game_content,
+parse_mode='Markdown')
+await play_sessions.record_turn(session, user_text, game_content,
+summarize_play_history)
+else:
+await update.effective_message.reply_text("Sorry, I couldn't continue the game
+just now. Please try that move again!")
+return # Stay in the session; state is kept for the next move
   else: # Default case for general story generation
 selected_language = context.user_data.get('selected_language', 'en')
 await update.effective_message.reply_text(f"Generating a story in
 {selected_language.upper()} about: {user_text}... Please wait! ⏳")
-title, body = retry_story_generation(f"Generate a story in {selected_language}
+title, body = await retry_story_generation(f"Generate a story in {selected_language}
 about: {user_text}", 1)
 content_type = "story"
 if 'selected_language' in context.user_data:
@@ -711,11 +773,7 @@ del context.user_data['selected_language']
   # This block handles all content generation (story, ebook, writer) that results in
 text output
 if title and body:
-context.user_data['last_content'] = {
-'title': title,
-'body': body,
-'type': content_type
-}
+store_last_content(context, body, content_type, title=title, language=selected_language)
   response_message = f"🧠 PROXORA AI PRESENTS\n" \
 f"📖 “{title}”\n\n" \
 f"---\n\n" \
@@ -752,7 +810,66 @@ if 'writer_tone' in context.user_data:
 del context.user_data['writer_tone']
 if 'tts_voice' in context.user_data:
 del context.user_data['tts_voice']
-  async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) 
+ # --- File Export ---
+async def start_export(update: Update, context: ContextTypes.DEFAULT_TYPE, file_format: str) -> None:
+"""
+Journals a file export and runs it. The job carries the content handle, so
+the export can be resumed after a restart even if user_data did not survive.
+"""
+query = update.callback_query
+last_content = context.user_data.get('last_content')
+content = None
+if last_content and 'handle' in last_content:
+content = {key: value for key, value in last_content.items() if key != 'body'}
+payload = {'format': file_format, 'content': content}
+if job_journal.draining:
+job_journal.accept('export', query.message.chat_id, update.effective_user.id, payload)
+await query.edit_message_text("PROXORA is restarting for an update. I'll send you a
+button to get your file as soon as I'm back! ⏳")
+return
+async with job_journal.track('export', query.message.chat_id, update.effective_user.id,
+payload):
+await run_export_job(update, context, file_format)
+ async def run_export_job(update: Update, context: ContextTypes.DEFAULT_TYPE, file_format: str) -> None:
+query = update.callback_query
+last_content = context.user_data.get('last_content')
+if last_content:
+title = last_content.get('title', 'Generated Document').replace(' ', '_').replace('"',
+'').replace("'", "")
+# Render from the document parsed at generation time; no markdown re-parsing
+if 'handle' in last_content:
+document = content_store.get_document(last_content['handle'])
+else: # Content stored before the content store existed
+document = parse_markdown(last_content['body']) if last_content.get('body') else None
+if document is None:
+await query.edit_message_text("This content has expired. Please generate it again!")
+return
+file_path = f"{title}.{file_format}"
+  if file_format == 'pdf':
+create_pdf(document, file_path, language=last_content.get('language'))
+elif file_format == 'docx':
+create_docx(document, file_path)
+elif file_format == 'txt':
+create_txt(document, file_path)
+else:
+await query.edit_message_text("Unsupported file format selected.")
+return
+  with open(file_path, 'rb') as f:
+if file_format == 'pdf':
+await context.bot.send_document(chat_id=query.message.chat_id,
+document=f, caption=f"Here's your content as a {file_format.upper()}!")
+elif file_format == 'docx':
+await context.bot.send_document(chat_id=query.message.chat_id,
+document=f, caption=f"Here's your content as a {file_format.upper()}!")
+elif file_format == 'txt':
+await context.bot.send_document(chat_id=query.message.chat_id,
+document=f, caption=f"Here's your content as a {file_format.upper()}!")
+os.remove(file_path) # Clean up the file after sendingawait query.edit_message_text(f"Your content has been sent as a
+{file_format.upper()}! Enjoy! 🎉")
+else:
+await query.edit_message_text("No content found to download. Please
+generate something first!")
+ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) 
 > None:
 query = update.callback_query
 await query.answer()
@@ -810,38 +927,42 @@ context.user_data['state'] = 'waiting_for_tts_age'
 await query.edit_message_text(f"You chose a {voice_type} voice persona. Now,
 please enter an approximate age for the voice (e.g., 30, 65): 🎂")
   elif query.data.startswith('download_'):
-file_format = query.data.replace('download_', '')
-last_content = context.user_data.get('last_content')
-if last_content:
-title = last_content.get('title', 'Generated Document').replace(' ', '_').replace('"',
-'').replace("'", "")
-# Use the full markdown content for downloads to ensure fidelity
-content_body = last_content.get('body', "No content available.")
-file_path = f"{title}.{file_format}"
-  if file_format == 'pdf':
-create_pdf(content_body, file_path)
-elif file_format == 'docx':
-create_docx(content_body, file_path)
-elif file_format == 'txt':
-create_txt(content_body, file_path)
+await start_export(update, context, query.data.replace('download_', ''))
+elif query.data.startswith('retry_'):
+# Re-run a request that was interrupted by a restart
+job = job_journal.get(query.data.replace('retry_', ''))
+if not job:
+await query.edit_message_text("That request has expired. Please send it again!")
+return
+job_journal.complete(job['id'])
+await query.edit_message_reply_markup(reply_markup=None)
+if job['kind'] == 'export':
+# The content handle travels with the job; user_data may not have survived the restart
+if job['payload'].get('content'):
+context.user_data['last_content'] = job['payload']['content']
+await start_export(update, context, job['payload']['format'])
 else:
-await query.edit_message_text("Unsupported file format selected.")
+context.user_data.update(job['payload']['user_data'])
+await handle_message(update, context, user_text=job['payload']['text'])
+elif query.data.startswith('library_'):
+entry = library.get_by_key(query.data.replace('library_', ''))
+if not entry:
+await query.edit_message_text("That story is no longer in the library. Try /library
+again!")
 return
-  with open(file_path, 'rb') as f:
-if file_format == 'pdf':
-await context.bot.send_document(chat_id=query.message.chat_id,
-document=f, caption=f"Here's your content as a {file_format.upper()}!")
-elif file_format == 'docx':
-await context.bot.send_document(chat_id=query.message.chat_id,
-document=f, caption=f"Here's your content as a {file_format.upper()}!")
-elif file_format == 'txt':
-await context.bot.send_document(chat_id=query.message.chat_id,
-document=f, caption=f"Here's your content as a {file_format.upper()}!")
-os.remove(file_path) # Clean up the file after sendingawait query.edit_message_text(f"Your content has been sent as a
-{file_format.upper()}! Enjoy! 🎉")
+if entry.pdf_path: # Pre-rendered PDF, no rendering cost
+with open(entry.pdf_path, 'rb') as f:
+await context.bot.send_document(chat_id=query.message.chat_id, document=f,
+caption=f"📄 {entry.title}")
 else:
-await query.edit_message_text("No content found to download. Please
-generate something first!")
+text = entry.read_text()
+if len(text) <= 4000:
+await context.bot.send_message(chat_id=query.message.chat_id, text=f"📖
+{entry.title}\n\n{text}")
+else:
+with open(entry.text_path, 'rb') as f:
+await context.bot.send_document(chat_id=query.message.chat_id, document=f,
+caption=f"📖 {entry.title}")
 elif query.data == 'null':
 # Do nothing for 'null' callbacks, used for informational buttons
 pass
@@ -872,10 +993,30 @@ elif command == 'play':
 await play_command(update, context)
 await query.edit_message_reply_markup(reply_markup=None) # Remove
 buttons after selection
- def main() -> None:
-"""Start the bot."""
-application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-  # Command Handlers
+ # --- Start-up ---
+def warm_up() -> None:
+"""
+Loads the heavy subsystems (Gemini SDK and clients, PDF/DOCX libraries and
+fonts, the story library index) in the background once the bot is polling,
+so none of it happens on the first user's request.
+"""
+with profile.phase("warm-up: gemini clients"):
+try:
+model_router.warm_up()
+except Exception as e:
+logger.error(f"Gemini warm-up failed, clients will be created on first use: {e}")
+with profile.phase("warm-up: exporters"):
+exporters.warm_up()
+with profile.phase("warm-up: story library"):
+library.refresh(force=True)
+profile.mark("warm-up done")
+ async def note_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+profile.mark("first update")
+ def register_handlers(application: Application) -> None:
+"""Registers all bot handlers. Shared by the single-process bot and the workers."""
+# Notes the first update for the start-up profile; group -1 runs before the other handlers
+application.add_handler(TypeHandler(Update, note_first_update), group=-1)
+# Command Handlers
 application.add_handler(CommandHandler("start", start_command))application.add_handler(CommandHandler("story", story_command))
 application.add_handler(CommandHandler("ebook", ebook_command))
 application.add_handler(CommandHandler("writer", writer_command))
@@ -887,6 +1028,9 @@ application.add_handler(CommandHandler("profile", profile_command))
 application.add_handler(CommandHandler("progress", progress_command))
 application.add_handler(CommandHandler("help", help_command))
 application.add_handler(CommandHandler("play", play_command))
+application.add_handler(CommandHandler("endplay", endplay_command))
+application.add_handler(CommandHandler("webapp", webapp_command))
+application.add_handler(CommandHandler("library", library_command))
    # Message Handler for states and WebApp data
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,
 handle_message))
@@ -894,7 +1038,54 @@ application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA,
 handle_webapp_data)) # Add this for WebApp data
   # Callback Query Handler for inline buttons
 application.add_handler(CallbackQueryHandler(button_callback))
+ # --- Graceful Shutdown and Restart Recovery ---
+async def notify_interrupted_jobs(application: Application) -> None:
+"""Offers every job interrupted by the previous shutdown back to its chat."""
+for job in job_journal.unfinished():
+if job['kind'] == 'export':
+button = InlineKeyboardButton(f"📄 📥 Download {job['payload']['format'].upper()}",
+callback_data=f"retry_{job['id']}")
+message = "⚠️ PROXORA restarted while preparing your file. Tap below to get it now!"
+else:
+button = InlineKeyboardButton("🔁 Resume my request",
+callback_data=f"retry_{job['id']}")
+message = (f"⚠️ PROXORA restarted while working on your request:\n"
+f"\"{job['payload']['text'][:200]}\"\n\nTap below to run it again – no need to resubmit!")
+try:
+await application.bot.send_message(chat_id=job['chat_id'], text=message,
+reply_markup=InlineKeyboardMarkup([[button]]))
+except Exception as e:
+logger.error(f"Could not notify chat {job['chat_id']} about interrupted job: {e}")
+job_journal.mark_notified(job['id'])
+ async def graceful_stop(application: Application) -> None:
+"""Stops taking new work, drains in-flight jobs, then stops polling."""
+job_journal.begin_drain()
+await job_journal.wait_idle()
+application.stop_running()
+ async def post_init(application: Application) -> None:
+loop = asyncio.get_running_loop()
+for sig in (signal.SIGTERM, signal.SIGINT):
+loop.add_signal_handler(sig, lambda: asyncio.ensure_future(graceful_stop(application)))
+await notify_interrupted_jobs(application)
+profile.mark("ready to poll")
+loop.run_in_executor(None, warm_up)
+ def main() -> None:
+"""Start the bot."""
+if NUM_WORKERS > 1:
+# Multi-worker mode: one ingress process polls and shards updates by user
+run_ingress(NUM_WORKERS)
+return
+ job_journal.init()
+profile.init()
+  # All outgoing calls go through the send scheduler to stay within Telegram's flood limits
+with profile.phase("build application"):
+application = (Application.builder().token(TELEGRAM_BOT_TOKEN).rate_limiter(SendScheduler())
+.concurrent_updates(UserOrderedUpdateProcessor()).post_init(post_init).build())
+register_handlers(application)
   logger.info("Bot starting...")
-application.run_polling(allowed_updates=Update.ALL_TYPES)
+# Signals are handled in post_init so in-flight jobs can drain first
+application.run_polling(allowed_updates=Update.ALL_TYPES, stop_signals=None)
+content_store.flush() # Keep generated content downloadable across restarts
+job_journal.close()
   if __name__ == "__main__":
 main()
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from document_model import Document, parse_markdown
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_STORE_DIR = os.getenv("CONTENT_STORE_DIR", "content_store")
+MAX_HOT_BYTES = int(os.getenv("CONTENT_STORE_MAX_HOT_BYTES", str(8 * 1024 * 1024)))  # compressed bytes kept in RAM
+CONTENT_TTL = int(os.getenv("CONTENT_STORE_TTL", str(7 * 24 * 3600)))  # seconds
+PURGE_INTERVAL = 600  # seconds between sweeps of expired entries
+
+
+def _compress(data: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return "zst", zstandard.ZstdCompressor(level=6).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("Content was stored with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class ContentStore:
+    """
+    Memory-bounded store for generated content (the parsed Document of a
+    story or ebook). Entries are kept compressed; only the most recently used
+    ones stay in RAM and the rest are spilled to disk by a background thread,
+    where they expire after `ttl` seconds. The footprint (stats()) is logged
+    with every purge sweep.
+    Callers keep the returned handle instead of the content itself.
+    """
+
+    def __init__(self, directory: str = CONTENT_STORE_DIR, max_hot_bytes: int = MAX_HOT_BYTES,
+                 ttl: int = CONTENT_TTL):
+        self.directory = directory  # created on the first spill
+        self.max_hot_bytes = max_hot_bytes
+        self.ttl = ttl
+        self._hot = OrderedDict()  # handle -> (codec, blob, created_at)
+        self._hot_bytes = 0
+        self._lock = threading.Lock()
+        self._last_purge = time.time()
+        self._spiller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="content-spill")
+        self._spill_scheduled = False
+
+    def _path(self, handle: str, codec: str) -> str:
+        return os.path.join(self.directory, f"{handle}.{codec}")
+
+    def _spill(self, handle: str, codec: str, blob: bytes, created_at: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(handle, codec)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+        os.utime(path, (created_at, created_at))
+
+    def _schedule_evict(self) -> None:
+        """Hands eviction to the spill thread if over budget (call with the lock held)."""
+        if self._hot_bytes > self.max_hot_bytes and not self._spill_scheduled:
+            self._spill_scheduled = True
+            self._spiller.submit(self._evict)
+
+    def _evict(self) -> None:
+        """
+        Spills least recently used entries until the hot set fits. An entry
+        stays hot (and readable) while it is written, and is dropped from RAM
+        only if it wasn't replaced or deleted meanwhile.
+        """
+        while True:
+            with self._lock:
+                if self._hot_bytes <= self.max_hot_bytes or len(self._hot) <= 1:
+                    self._spill_scheduled = False
+                    return
+                handle, entry = next(iter(self._hot.items()))
+            try:
+                self._spill(handle, *entry)
+            except OSError as e:
+                logger.error(f"Could not spill content {handle} to disk: {e}")
+                with self._lock:
+                    self._spill_scheduled = False
+                return
+            with self._lock:
+                if self._hot.get(handle) is entry:
+                    del self._hot[handle]
+                    self._hot_bytes -= len(entry[1])
+
+    def put(self, document: Document) -> str:
+        """Stores a parsed document and returns its handle."""
+        handle = uuid.uuid4().hex
+        data = json.dumps(document.to_dict(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        codec, blob = _compress(data)
+        with self._lock:
+            self._hot[handle] = (codec, blob, time.time())
+            self._hot_bytes += len(blob)
+            self._schedule_evict()
+        self._maybe_purge()
+        return handle
+
+    def get_document(self, handle: str) -> Document | None:
+        """Returns the document for a handle, or None if it is unknown or expired."""
+        record = self._get_record(handle)
+        if record is None:
+            return None
+        if "blocks" in record:
+            return Document.from_dict(record)
+        # Entries spilled by older releases hold the markdown and, usually, the document
+        if record.get("doc") is not None:
+            return Document.from_dict(record["doc"])
+        return parse_markdown(record["body"])
+
+    def _get_record(self, handle: str) -> dict | None:
+        with self._lock:
+            entry = self._hot.get(handle)
+            if entry is not None and time.time() - entry[2] <= self.ttl:
+                self._hot.move_to_end(handle)
+                codec, blob, _ = entry
+                return json.loads(_decompress(codec, blob))
+        if entry is not None:
+            # Expired: drop it (and any spilled copy) now rather than at the next purge
+            self.delete(handle)
+            return None
+
+        for codec in ("zst", "zlib"):
+            path = self._path(handle, codec)
+            try:
+                created_at = os.path.getmtime(path)
+                if time.time() - created_at > self.ttl:
+                    os.remove(path)
+                    return None
+                with open(path, 'rb') as f:
+                    blob = f.read()
+            except FileNotFoundError:
+                continue
+            # Promote back to the hot set; the disk copy stays until it is purged.
+            # Another thread may have promoted it meanwhile; count its size once.
+            with self._lock:
+                if handle not in self._hot:
+                    self._hot[handle] = (codec, blob, created_at)
+                    self._hot_bytes += len(blob)
+                    self._schedule_evict()
+            return json.loads(_decompress(codec, blob))
+        return None
+
+    def delete(self, handle: str) -> None:
+        with self._lock:
+            entry = self._hot.pop(handle, None)
+            if entry is not None:
+                self._hot_bytes -= len(entry[1])
+        for codec in ("zst", "zlib"):
+            try:
+                os.remove(self._path(handle, codec))
+            except FileNotFoundError:
+                pass
+
+    def _disk_files(self) -> list:
+        try:
+            return [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except FileNotFoundError:  # nothing spilled yet
+            return []
+
+    def _maybe_purge(self) -> None:
+        if time.time() - self._last_purge >= PURGE_INTERVAL:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Drops every entry older than the TTL and logs the footprint. Returns the number removed."""
+        now = time.time()
+        self._last_purge = now
+        removed = 0
+        with self._lock:
+            for handle in [h for h, (_, _, created) in self._hot.items() if now - created > self.ttl]:
+                _, blob, _ = self._hot.pop(handle)
+                self._hot_bytes -= len(blob)
+                removed += 1
+        for entry in self._disk_files():
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        stats = self.stats()
+        logger.info(f"Content store: purged {removed} expired entries; {stats['hot_entries']} entries "
+                    f"({stats['hot_bytes'] // 1024} of {stats['max_hot_bytes'] // 1024} KB) in memory, "
+                    f"{stats['disk_entries']} ({stats['disk_bytes'] // 1024} KB) on disk, codec {stats['codec']}")
+        return removed
+
+    def flush(self) -> None:
+        """Spills every hot entry to disk, e.g. before the process exits."""
+        self._spiller.submit(lambda: None).result()  # waits for a running eviction
+        with self._lock:
+            entries = list(self._hot.items())
+        for handle, (codec, blob, created_at) in entries:
+            if not os.path.exists(self._path(handle, codec)):
+                self._spill(handle, codec, blob, created_at)
+
+    def stats(self) -> dict:
+        """Reports the store's memory and disk footprint."""
+        disk_entries, disk_bytes = 0, 0
+        for entry in self._disk_files():
+            if not entry.name.endswith(".tmp"):
+                disk_entries += 1
+                disk_bytes += entry.stat().st_size
+        with self._lock:
+            return {
+                "hot_entries": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "max_hot_bytes": self.max_hot_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+                "codec": "zst" if zstandard is not None else "zlib",
+            }
+
+
+content_store = ContentStore()
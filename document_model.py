@@ -0,0 +1,152 @@
+import re
+
+# --- Intermediate document model ---
+# Generated markdown is parsed once into this model and every exporter renders
+# from it. Blocks and runs are plain tuples so a document is cheap to keep and
+# serialises straight to JSON:
+#   run     = (text, bold, italic)
+#   heading = ("h", level, [runs])
+#   para    = ("p", [runs])
+#   bullet  = ("li", [runs])
+#   ordered = ("ol", number, [runs])   numbered list item, keeps its number
+#   break   = ("br",)
+
+HEADING_RE = re.compile(r'^\s*(#{1,6})\s*(.*?)\s*#*\s*$')
+BOLD_LINE_RE = re.compile(r'^\s*([^\w\s*]+\s*)?\*\*([^*]+?)\*\*\s*:?\s*$')  # optional emoji prefix
+SUMMARY_RE = re.compile(r'^\s*[_*]([^_*].*?)[_*]\s*$')
+SUMMARY_LABEL_RE = re.compile(r'^\s*\*\*Summary:?\*\*\s*:?\s*(.*)$', re.IGNORECASE)
+BULLET_RE = re.compile(r'^\s*[-*+•]\s+(.*)$')
+NUMBERED_RE = re.compile(r'^\s*(\d{1,4})[.)]\s+(.*)$')
+INLINE_RE = re.compile(r'\*\*(.+?)\*\*|__(.+?)__|(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)')
+SECTION_PREFIXES = ("Chapter", "Introduction", "Conclusion")
+
+
+class Document:
+    """A parsed story or ebook: title, optional summary and a list of blocks."""
+
+    __slots__ = ("title", "summary", "blocks")
+
+    def __init__(self, title: str, summary: str | None = None, blocks: list | None = None):
+        self.title = title
+        self.summary = summary
+        self.blocks = blocks if blocks is not None else []
+
+    def to_dict(self) -> dict:
+        return {"title": self.title, "summary": self.summary, "blocks": self.blocks}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Document":
+        # JSON turns tuples into lists; exporters only index into them.
+        return cls(data["title"], data.get("summary"), data.get("blocks", []))
+
+
+def parse_inline(text: str) -> list:
+    """Splits a line into (text, bold, italic) runs."""
+    runs = []
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > position:
+            runs.append((text[position:match.start()], False, False))
+        bold_text = match.group(1) or match.group(2)
+        if bold_text is not None:
+            # Allow italics nested inside bold (e.g. **_word_**)
+            for inner_text, _, inner_italic in parse_inline(bold_text):
+                runs.append((inner_text, True, inner_italic))
+        else:
+            runs.append((match.group(3) or match.group(4), False, True))
+        position = match.end()
+    if position < len(text):
+        runs.append((text[position:], False, False))
+    return runs
+
+
+def plain_text(runs: list) -> str:
+    return "".join(run[0] for run in runs)
+
+
+def parse_markdown(markdown: str, title: str | None = None, default_title: str = "Generated Document") -> Document:
+    """
+    Parses generated markdown into a Document. The first line becomes the title
+    when it is bold or a heading (unless `title` is given), and an italic line
+    right after it becomes the summary.
+    """
+    lines = markdown.strip().split('\n')
+    index = 0
+
+    if title is None:
+        title = default_title
+        if lines and lines[0].strip():
+            bold_match = BOLD_LINE_RE.match(lines[0])
+            heading_match = HEADING_RE.match(lines[0])
+            if bold_match:
+                title = bold_match.group(2).strip()
+                index = 1
+            elif heading_match:
+                title = plain_text(parse_inline(heading_match.group(2))) or default_title
+                index = 1
+
+    summary = None
+    while index < len(lines) and not lines[index].strip():
+        index += 1
+    if index < len(lines):
+        summary_match = SUMMARY_RE.match(lines[index])
+        label_match = SUMMARY_LABEL_RE.match(lines[index])
+        if summary_match:
+            summary = plain_text(parse_inline(summary_match.group(1).strip()))
+            index += 1
+        elif label_match:
+            # "**Summary:**" either followed by the text or on its own line
+            index += 1
+            summary = label_match.group(1).strip()
+            if not summary and index < len(lines) and lines[index].strip():
+                summary = lines[index].strip()
+                index += 1
+            summary = plain_text(parse_inline(summary)) or None
+
+    blocks = []
+    for line in lines[index:]:
+        stripped = line.strip()
+        if not stripped:
+            if blocks and blocks[-1][0] != "br":
+                blocks.append(("br",))
+            continue
+        heading_match = HEADING_RE.match(stripped)
+        if heading_match and heading_match.group(2):
+            blocks.append(("h", min(len(heading_match.group(1)) + 1, 6), parse_inline(heading_match.group(2))))
+            continue
+        bold_match = BOLD_LINE_RE.match(stripped)
+        if bold_match:
+            prefix = bold_match.group(1) or ""
+            blocks.append(("h", 2, [(prefix + bold_match.group(2).strip(), False, False)]))
+            continue
+        if stripped.startswith(SECTION_PREFIXES) and len(stripped) < 80:
+            blocks.append(("h", 2, parse_inline(stripped)))
+            continue
+        bullet_match = BULLET_RE.match(stripped)
+        if bullet_match:
+            blocks.append(("li", parse_inline(bullet_match.group(1))))
+            continue
+        numbered_match = NUMBERED_RE.match(stripped)
+        if numbered_match:
+            blocks.append(("ol", int(numbered_match.group(1)), parse_inline(numbered_match.group(2))))
+            continue
+        blocks.append(("p", parse_inline(stripped)))
+
+    while blocks and blocks[-1][0] == "br":
+        blocks.pop()
+    return Document(title, summary, blocks)
+
+
+def split_title_and_body(full_text: str) -> tuple[str, str]:
+    """
+    Splits a plain (non-markdown) generation of the form "Title: ... Story: ..."
+    or "<title>\\n\\n<body>" into its title and body.
+    """
+    if "Title:" in full_text and "Story:" in full_text:
+        parts = full_text.split("Story:", 1)
+        title_line = parts[0].replace("Title:", "").strip()
+        return title_line.split('\n')[0].strip(), parts[1].strip()
+    if "\n\n" in full_text:
+        title, body = full_text.split('\n\n', 1)
+        return title.strip(), body.strip()
+    return "Generated Story", full_text
@@ -0,0 +1,164 @@
+from xml.sax.saxutils import escape
+
+from document_model import Document, plain_text
+
+# --- PDF/DOCX/TXT exporters ---
+# All exporters render from a parsed Document (see document_model.py), so the
+# markdown is never re-parsed when the same content is downloaded again.
+# ReportLab and python-docx are imported on first use (or by warm_up) to keep
+# them off the bot's start-up path.
+
+
+def _runs_to_markup(runs: list) -> str:
+    """Converts runs to ReportLab's mini-HTML, escaping the text itself."""
+    parts = []
+    for text, bold, italic in runs:
+        text = escape(text)
+        if italic:
+            text = f"<i>{text}</i>"
+        if bold:
+            text = f"<b>{text}</b>"
+        parts.append(text)
+    return "".join(parts)
+
+
+def warm_up() -> None:
+    """Imports the PDF/DOCX libraries and builds the default font and styles."""
+    import docx  # noqa: F401
+    from pdf_fonts import fonts
+    fonts.styles("latin")
+
+
+def _sample_text(document: Document) -> str:
+    """The start of the document's text, enough to tell which script it is in."""
+    from pdf_fonts import DETECT_SAMPLE_CHARS
+    parts, size = [document.title], len(document.title)
+    for block in document.blocks:
+        if size >= DETECT_SAMPLE_CHARS:
+            break
+        if block[0] != "br":
+            text = plain_text(block[-1])
+            parts.append(text)
+            size += len(text)
+    return "\n".join(parts)
+
+
+def create_pdf(document: Document, filename: str, language: str | None = None):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from pdf_fonts import fonts
+
+    doc = SimpleDocTemplate(filename, pagesize=letter)
+    # Cached per script; shared between exports, so never modified here
+    styles = fonts.styles_for_text(_sample_text(document), language)
+
+    title_style = styles['title']
+    summary_style = styles['summary']
+    heading_styles = {level: styles[f'h{min(level, 6)}'] for level in range(2, 7)}
+    body_style = styles['body']
+    bullet_style = styles['bullet']
+
+    elements = [Paragraph(escape(document.title), title_style)]
+    if document.summary:
+        elements.append(Paragraph(escape(document.summary), summary_style))
+    elements.append(Spacer(1, 0.2 * 100))
+
+    for block in document.blocks:
+        kind = block[0]
+        if kind == "h":
+            elements.append(Paragraph(_runs_to_markup(block[2]), heading_styles[block[1]]))
+        elif kind == "p":
+            elements.append(Paragraph(_runs_to_markup(block[1]), body_style))
+            elements.append(Spacer(1, 0.1 * 100))
+        elif kind == "li":
+            elements.append(Paragraph(_runs_to_markup(block[1]), bullet_style, bulletText='•'))
+        elif kind == "ol":
+            elements.append(Paragraph(_runs_to_markup(block[2]), bullet_style, bulletText=f'{block[1]}.'))
+        else:
+            elements.append(Spacer(1, 0.1 * 100))
+
+    doc.build(elements)
+
+
+def _add_runs(paragraph, runs: list) -> None:
+    for text, bold, italic in runs:
+        run = paragraph.add_run(text)
+        run.bold = bold or None
+        run.italic = italic or None
+
+
+def _restart_numbering(docx, paragraph, start: int) -> int:
+    """
+    Gives a 'List Number' paragraph its own numbering that starts at `start`,
+    so each list keeps the numbers of the markdown instead of continuing the
+    previous list. Returns the new numbering id for the list's other items.
+    """
+    numbering = docx.part.numbering_part.element
+    style_num_id = docx.styles['List Number'].element.pPr.numPr.numId.val
+    abstract_id = numbering.num_having_numId(style_num_id).abstractNumId.val
+    num = numbering.add_num(abstract_id)
+    num.add_lvlOverride(ilvl=0).add_startOverride(start)
+    _set_num_id(paragraph, num.numId)
+    return num.numId
+
+
+def _set_num_id(paragraph, num_id: int) -> None:
+    num_pr = paragraph._p.get_or_add_pPr().get_or_add_numPr()
+    num_pr.get_or_add_ilvl().val = 0
+    num_pr.get_or_add_numId().val = num_id
+
+
+def create_docx(document: Document, filename: str):
+    from docx import Document as DocxDocument
+
+    docx = DocxDocument()
+    docx.add_heading(document.title, level=0)
+    if document.summary:
+        docx.add_paragraph().add_run(document.summary).italic = True
+
+    num_id = None  # numbering of the ordered list being written
+    for block in document.blocks:
+        kind = block[0]
+        if kind != "ol":
+            num_id = None
+        if kind == "h":
+            _add_runs(docx.add_heading(level=min(block[1] - 1, 9)), block[2])
+        elif kind == "p":
+            _add_runs(docx.add_paragraph(), block[1])
+        elif kind == "li":
+            _add_runs(docx.add_paragraph(style='List Bullet'), block[1])
+        elif kind == "ol":
+            paragraph = docx.add_paragraph(style='List Number')
+            if num_id is None:
+                num_id = _restart_numbering(docx, paragraph, block[1])
+            else:
+                _set_num_id(paragraph, num_id)
+            _add_runs(paragraph, block[2])
+        # Paragraph spacing in Word already separates blocks; "br" needs nothing.
+
+    docx.save(filename)
+
+
+def render_text(document: Document) -> str:
+    lines = [document.title, "=" * len(document.title)]
+    if document.summary:
+        lines += ["", document.summary]
+    lines.append("")
+    for block in document.blocks:
+        kind = block[0]
+        if kind == "h":
+            lines += ["", plain_text(block[2]).upper() if block[1] <= 2 else plain_text(block[2]), ""]
+        elif kind == "p":
+            lines.append(plain_text(block[1]))
+        elif kind == "li":
+            lines.append(f"  • {plain_text(block[1])}")
+        elif kind == "ol":
+            lines.append(f"  {block[1]}. {plain_text(block[2])}")
+        elif lines[-1]:
+            lines.append("")
+    return "\n".join(lines).strip() + "\n"
+
+
+def create_txt(document: Document, filename: str):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(render_text(document))
@@ -0,0 +1,76 @@
+"""
+Downloads the Noto fonts listed in pdf_fonts.SCRIPT_FONTS into fonts/, so PDF
+exports can typeset every supported script instead of falling back to
+Helvetica. Run at build time (bin/post_compile on Heroku) or once locally:
+
+    python fetch_fonts.py
+
+Fonts already in fonts/ are skipped.
+"""
+import logging
+import os
+import sys
+
+import requests
+
+from pdf_fonts import BASE_DIR, SCRIPT_FONTS
+
+logger = logging.getLogger(__name__)
+
+FONTS_DIR = os.path.join(BASE_DIR, "fonts")
+NOTO_URL = "https://raw.githubusercontent.com/notofonts/notofonts.github.io/main/fonts/{family}/hinted/ttf/{file}"
+# The CJK families are only published as OpenType/CFF (which ReportLab can't
+# embed) or as one variable TrueType font, whose default instance is the
+# regular weight. Bold text in these scripts uses the regular face.
+CJK_URLS = {
+    "NotoSansJP-Regular.ttf": "https://raw.githubusercontent.com/google/fonts/main/ofl/notosansjp/NotoSansJP%5Bwght%5D.ttf",
+    "NotoSansKR-Regular.ttf": "https://raw.githubusercontent.com/google/fonts/main/ofl/notosanskr/NotoSansKR%5Bwght%5D.ttf",
+    "NotoSansSC-Regular.ttf": "https://raw.githubusercontent.com/google/fonts/main/ofl/notosanssc/NotoSansSC%5Bwght%5D.ttf",
+}
+CJK_FAMILIES = ("NotoSansJP", "NotoSansKR", "NotoSansSC")
+DOWNLOAD_TIMEOUT = 60
+
+
+def font_urls() -> dict:
+    """file name -> download URL for the preferred (Noto) candidate of every script."""
+    urls = {}
+    for candidates in SCRIPT_FONTS.values():
+        for filename in candidates[0]:
+            family = filename.split("-")[0]
+            if filename in CJK_URLS:
+                urls[filename] = CJK_URLS[filename]
+            elif family not in CJK_FAMILIES:
+                urls[filename] = NOTO_URL.format(family=family, file=filename)
+    return urls
+
+
+def fetch(filename: str, url: str) -> bool:
+    path = os.path.join(FONTS_DIR, filename)
+    if os.path.exists(path):
+        return True
+    try:
+        response = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Could not download {filename} from {url}: {e}")
+        return False
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    logger.info(f"Downloaded {filename} ({len(response.content) // 1024} KB)")
+    return True
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    failed = [filename for filename, url in font_urls().items() if not fetch(filename, url)]
+    if failed:
+        logger.error(f"{len(failed)} font(s) missing, their scripts fall back to other fonts: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,50 +1,54 @@
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 import os
 
+from pdf_fonts import fonts
+
 def create_chapter_pdf(text_file_path, output_pdf_path, title):
     doc = SimpleDocTemplate(output_pdf_path, pagesize=letter)
-    styles = getSampleStyleSheet()
     story = []
 
+    with open(text_file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    # Font and styles are picked by the text's script (cached per process)
+    styles = fonts.styles_for_text(title + "\n" + content)
+
     # Add title to the PDF
     story.append(Paragraph(title, styles['h1']))
     story.append(Spacer(1, 0.2 * 100)) # Add some space after title
 
-    with open(text_file_path, 'r') as f:
-        content = f.read()
-        # Split content into paragraphs and add them
-        paragraphs = content.split('\n\n') # Assuming double newline separates paragraphs
-        for para in paragraphs:
-            if para.strip(): # Ensure paragraph is not empty
-                story.append(Paragraph(para.strip(), styles['Normal']))
-                story.append(Spacer(1, 0.1 * 100)) # Add space between paragraphs
+    # Split content into paragraphs and add them
+    paragraphs = content.split('\n\n') # Assuming double newline separates paragraphs
+    for para in paragraphs:
+        if para.strip(): # Ensure paragraph is not empty
+            story.append(Paragraph(para.strip(), styles['body']))
+            story.append(Spacer(1, 0.1 * 100)) # Add space between paragraphs
 
     doc.build(story)
     print(f"PDF '{output_pdf_path}' created successfully.")
 
 def create_multi_page_pdf(chapter_files_and_titles, output_pdf_path):
     doc = SimpleDocTemplate(output_pdf_path, pagesize=letter)
-    styles = getSampleStyleSheet()
     story = []
 
     for i, (text_file_path, title) in enumerate(chapter_files_and_titles):
+        with open(text_file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        styles = fonts.styles_for_text(title + "\n" + content)
+
         # Add chapter title
         story.append(Paragraph(title, styles['h1']))
         story.append(Spacer(1, 0.2 * 100)) # Add some space after title
 
-        with open(text_file_path, 'r') as f:
-            content = f.read()
-            paragraphs = content.split('\n\n')
-            for para in paragraphs:
-                if para.strip():
-                    story.append(Paragraph(para.strip(), styles['Normal']))
-                    story.append(Spacer(1, 0.1 * 100))
+        paragraphs = content.split('\n\n')
+        for para in paragraphs:
+            if para.strip():
+                story.append(Paragraph(para.strip(), styles['body']))
+                story.append(Spacer(1, 0.1 * 100))
 
         # Add a page break after each chapter, except the last one
         if i < len(chapter_files_and_titles) - 1:
-            story.append(Paragraph("<pageBreak/>", styles['Normal']))
+            story.append(PageBreak())
 
     doc.build(story)
     print(f"Multi-page PDF '{output_pdf_path}' created successfully.")
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+JOB_JOURNAL_PATH = os.getenv("JOB_JOURNAL_PATH", "job_journal.jsonl")
+DRAIN_GRACE_PERIOD = float(os.getenv("DRAIN_GRACE_PERIOD", "25"))  # Heroku sends SIGKILL 30s after SIGTERM
+JOB_RETRY_TTL = 24 * 3600  # interrupted jobs older than this are dropped on start
+COMPACT_AFTER = int(os.getenv("JOB_JOURNAL_COMPACT_AFTER", "500"))  # completed jobs between rewrites
+
+
+class JobJournal:
+    """
+    Write-ahead journal of accepted generation, TTS and export jobs.
+    Every job is appended when accepted and again when it completes, so after
+    a crash or redeploy the unfinished ones can be found and offered back to
+    their chats. Records are written and fsynced by a background thread, in
+    batches, so the event loop never waits for the disk; the file is rewritten
+    with only the unfinished jobs on start and every COMPACT_AFTER completed
+    jobs. Also tracks in-flight jobs so a shutdown can stop taking work and
+    drain what is running.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.draining = False
+        self._lock = threading.Lock()
+        self._pending = {}  # job id -> job record, accepted but not completed
+        self._in_flight = 0
+        self._idle = None  # asyncio.Event, created lazily inside the event loop
+        self._file = None
+        self._queue = queue.Queue()
+        self._writer = None
+        self._completed = 0  # since the last compaction
+
+    def init(self, path: str = JOB_JOURNAL_PATH) -> None:
+        """
+        Opens the journal. Called by the process that handles updates (the
+        single-process bot or a worker, with its shard's path), never at
+        import: spawned workers re-import bot.py, and a journal opened there
+        would be shared by every process.
+        """
+        if self._file is not None:
+            return
+        self.path = path
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._writer = threading.Thread(target=self._write_loop, name="job-journal", daemon=True)
+        self._writer.start()
+
+    # --- Journal file ---
+    def _load(self) -> None:
+        """Replays the journal and rewrites it with only the unfinished jobs."""
+        if not os.path.exists(self.path):
+            return
+        pending = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crash
+                if record.get("op") == "accept":
+                    pending[record["id"]] = record
+                elif record.get("op") in ("notified", "done"):
+                    job = pending.get(record["id"])
+                    if job is not None:
+                        if record["op"] == "done":
+                            del pending[record["id"]]
+                        else:
+                            job["notified"] = True
+
+        cutoff = time.time() - JOB_RETRY_TTL
+        self._pending = {job_id: job for job_id, job in pending.items() if job["ts"] >= cutoff}
+        self._rewrite(list(self._pending.values()))
+        if self._pending:
+            logger.info(f"Job journal: {len(self._pending)} unfinished jobs from the previous run")
+
+    def _rewrite(self, jobs: list) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for job in jobs:
+                f.write(json.dumps(job, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record: dict) -> None:
+        if self._writer is None:
+            raise RuntimeError("Job journal used before init()")
+        # Serialised here: the job dict may still change (notified) while queued
+        self._queue.put((json.dumps(record, ensure_ascii=False) + "\n", record["op"] == "done"))
+
+    def _write_loop(self) -> None:
+        """Writes queued records in batches with one fsync each (runs on the writer thread)."""
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            try:
+                for line, _ in records:
+                    self._file.write(line)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._completed += sum(done for _, done in records)
+                if self._completed >= COMPACT_AFTER:
+                    self._compact()
+            except OSError as e:
+                logger.error(f"Could not write job journal {self.path}: {e}")
+            if stop:
+                return
+
+    def _compact(self) -> None:
+        """
+        Rewrites the file with only the unfinished jobs. Records still queued
+        are written after the rewrite; replaying an accept twice or a done for
+        a job that is gone is harmless.
+        """
+        with self._lock:
+            jobs = [dict(job) for job in self._pending.values()]
+        self._file.close()
+        self._rewrite(jobs)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._completed = 0
+
+    # --- Job lifecycle ---
+    def accept(self, kind: str, chat_id: int, user_id: int | None, payload: dict) -> str:
+        """Records an accepted job and returns its id."""
+        job = {"op": "accept", "id": uuid.uuid4().hex[:12], "kind": kind, "chat_id": chat_id,
+               "user_id": user_id, "payload": payload, "ts": time.time()}
+        self._append(job)
+        with self._lock:
+            self._pending[job["id"]] = job
+        return job["id"]
+
+    def complete(self, job_id: str) -> None:
+        with self._lock:
+            if self._pending.pop(job_id, None) is None:
+                return
+        self._append({"op": "done", "id": job_id})
+
+    def mark_notified(self, job_id: str) -> None:
+        """Records that the chat was told about the interrupted job."""
+        with self._lock:
+            job = self._pending.get(job_id)
+            if job is None:
+                return
+            job["notified"] = True
+        self._append({"op": "notified", "id": job_id})
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._pending.get(job_id)
+
+    def unfinished(self, include_notified: bool = False) -> list:
+        with self._lock:
+            return [job for job in self._pending.values() if include_notified or not job.get("notified")]
+
+    @asynccontextmanager
+    async def track(self, kind: str, chat_id: int, user_id: int | None, payload: dict):
+        """
+        Journals a job for the duration of the block. A job that raises is
+        still marked done (it was answered or failed, not interrupted); only
+        a process that dies mid-job leaves it unfinished.
+        """
+        job_id = self.accept(kind, chat_id, user_id, payload)
+        self._in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            yield job_id
+        finally:
+            self._in_flight -= 1
+            self.complete(job_id)
+            if self._in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    # --- Graceful shutdown ---
+    def begin_drain(self) -> None:
+        """Stops taking new work; new jobs should be accepted but not started."""
+        if not self.draining:
+            logger.info(f"Draining: {self._in_flight} jobs in flight")
+        self.draining = True
+
+    async def wait_idle(self, timeout: float = DRAIN_GRACE_PERIOD) -> bool:
+        """Waits until no job is in flight. Returns False if the grace period ran out."""
+        if self._in_flight == 0:
+            return True
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain grace period over with {self._in_flight} jobs still running")
+            return False
+
+    def close(self) -> None:
+        """Writes everything still queued and closes the file."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+job_journal = JobJournal()
@@ -0,0 +1,152 @@
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from contextlib import contextmanager
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "200"))      # prompts / responses
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))            # for records marked with `sample`
+
+# Structured fields that may be passed through `extra=` and are appended to
+# the line as key=value pairs.
+STRUCTURED_FIELDS = ("user", "chat", "mode", "language", "latency", "tokens", "prompt", "response")
+TRUNCATED_FIELDS = ("prompt", "response")
+
+_context_fields = contextvars.ContextVar("log_fields", default={})
+_listener = None
+_stream_handler = None
+
+
+def _truncate(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}...[+{len(value) - limit} chars]"
+
+
+@contextmanager
+def log_fields(**fields):
+    """
+    Adds structured fields (user, language, ...) to every record logged in the
+    block, including from helpers that don't know about the request, and from
+    threads started with asyncio.to_thread, which copy the context.
+    """
+    token = _context_fields.set({**_context_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _context_fields.reset(token)
+
+
+class ContextFieldsFilter(logging.Filter):
+    """Copies the fields set with log_fields() onto records that don't set them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for field, value in _context_fields.get().items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of high-volume records. A record opts in by passing
+    `extra={'sample': True}`; warnings and errors are always kept.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        return random.random() < self.rate
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that truncates long messages and prompt/response fields on
+    the calling thread, so huge payloads are never copied onto the queue.
+    Records are dropped rather than blocking the event loop when the queue is
+    full; warnings and errors are the exception and always wait for room.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for field in TRUNCATED_FIELDS:
+            value = getattr(record, field, None)
+            if isinstance(value, str):
+                setattr(record, field, _truncate(value, LOG_MAX_FIELD_CHARS))
+        record = super().prepare(record)
+        if record.levelno < logging.ERROR:
+            record.msg = _truncate(record.msg, LOG_MAX_MESSAGE_CHARS)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class StructuredFormatter(logging.Formatter):
+    """Appends the structured fields present on a record as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = []
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is None:
+                continue
+            if field == "latency" and isinstance(value, float):
+                value = f"{value:.3f}s"
+            fields.append(f"{field}={value!r}" if isinstance(value, str) else f"{field}={value}")
+        return f"{line} | {' '.join(fields)}" if fields else line
+
+
+def setup_logging(fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+    """
+    Routes all logging through a bounded queue drained by a background writer
+    thread, so handlers never block on log I/O. Calling it again only changes
+    the format and level; worker processes, which have already set it up while
+    importing bot.py, use that to add their worker id to every line.
+    """
+    global _listener, _stream_handler
+    if _listener is not None:
+        _stream_handler.setFormatter(StructuredFormatter(fmt))
+        logging.getLogger().setLevel(level)
+        return
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = TruncatingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(ContextFieldsFilter())
+
+    _stream_handler = logging.StreamHandler()
+    _stream_handler.setFormatter(StructuredFormatter(fmt))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, _stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
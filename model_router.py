@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import GEMINI_API_KEY
+
+logger = logging.getLogger(__name__)
+
+# --- Model selection ---
+# Heavy, long-form modes keep the default model; short interactive replies
+# (TTS answers and /play turns) use a lighter model.
+DEFAULT_MODEL = os.getenv("GEMINI_DEFAULT_MODEL", "gemini-1.5-flash")
+LIGHT_MODEL = os.getenv("GEMINI_LIGHT_MODEL", "gemini-1.5-flash-8b")
+
+MODE_MODELS = {
+    "story": DEFAULT_MODEL,
+    "ebook": DEFAULT_MODEL,
+    "writer": DEFAULT_MODEL,
+    "tts": LIGHT_MODEL,
+    "play": LIGHT_MODEL,
+}
+
+# Model used for the hedged (second) request when the primary is slow.
+HEDGE_MODELS = {
+    DEFAULT_MODEL: DEFAULT_MODEL,
+    LIGHT_MODEL: DEFAULT_MODEL,
+}
+
+LATENCY_WINDOW = 100         # samples kept per model
+MIN_SAMPLES_FOR_HEDGE = 20   # don't hedge until p95 is meaningful
+MIN_HEDGE_DELAY = 1.0        # seconds; never hedge earlier than this
+MAX_HEDGE_RATE = float(os.getenv("GEMINI_MAX_HEDGE_RATE", "0.1"))  # share of recent calls that may hedge
+
+
+class LatencyTracker:
+    """Rolling window of request latencies (and of hedging) for one model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._hedged = deque(maxlen=window)  # one bool per routed request
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def record_request(self, hedged: bool) -> None:
+        with self._lock:
+            self._hedged.append(hedged)
+
+    def hedge_rate(self) -> float:
+        with self._lock:
+            return sum(self._hedged) / len(self._hedged) if self._hedged else 0.0
+
+    def p95(self) -> float | None:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES_FOR_HEDGE:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ModelRouter:
+    """
+    Picks a Gemini model per mode, reuses model clients and hedges slow calls.
+    When the first request runs past the model's rolling p95, a second request
+    is sent; whichever answers first wins and the other one is cancelled. At
+    most MAX_HEDGE_RATE of recent requests are hedged, so a slow model (or a
+    busy pool) doesn't double the load.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._models = {}
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self._configured = False
+
+    def _genai(self):
+        # google.generativeai takes a while to import; load it on first use
+        # (or from the background warm-up) instead of at bot start
+        import google.generativeai as genai
+        if not self._configured:
+            genai.configure(api_key=GEMINI_API_KEY)
+            self._configured = True
+        return genai
+
+    def generation_config(self, **kwargs):
+        return self._genai().types.GenerationConfig(**kwargs)
+
+    def get_model(self, model_name: str):
+        with self._lock:
+            genai = self._genai()
+            model = self._models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    def _tracker(self, model_name: str) -> LatencyTracker:
+        with self._lock:
+            tracker = self._trackers.get(model_name)
+            if tracker is None:
+                tracker = LatencyTracker()
+                self._trackers[model_name] = tracker
+            return tracker
+
+    def _timed_call(self, mode: str, model_name: str, prompt: str, generation_config):
+        start = time.monotonic()
+        response = self.get_model(model_name).generate_content(prompt, generation_config=generation_config)
+        latency = time.monotonic() - start
+        self._tracker(model_name).record(latency)
+        usage = getattr(response, "usage_metadata", None)
+        logger.info(
+            "Gemini %s responded", model_name,
+            extra={"mode": mode, "latency": latency,
+                   "tokens": getattr(usage, "total_token_count", None), "sample": True},
+        )
+        return response
+
+    def _submit(self, mode: str, model_name: str, prompt: str, generation_config,
+                started: asyncio.Event | None = None) -> asyncio.Future:
+        # The blocking SDK call runs on the pool; the caller's context carries the log fields
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+
+        def run():
+            if started is not None:
+                loop.call_soon_threadsafe(started.set)
+            return self._timed_call(mode, model_name, prompt, generation_config)
+
+        return asyncio.wrap_future(self._executor.submit(context.run, run))
+
+    async def generate_content(self, mode: str, prompt: str, generation_config=None):
+        """
+        Generates content with the model assigned to `mode`. The SDK calls run
+        on the router's thread pool; the event loop only awaits them.
+        Raises the primary request's exception if every attempt fails.
+        """
+        model_name = MODE_MODELS.get(mode, DEFAULT_MODEL)
+        tracker = self._tracker(model_name)
+        started = asyncio.Event()
+        primary = self._submit(mode, model_name, prompt, generation_config, started)
+
+        p95 = tracker.p95()
+        if p95 is None or tracker.hedge_rate() >= MAX_HEDGE_RATE:
+            tracker.record_request(hedged=False)
+            return await primary
+
+        # p95 is the call's own latency; time spent queued for a pool thread doesn't count
+        waiter = asyncio.ensure_future(started.wait())
+        await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        done, _ = await asyncio.wait({primary}, timeout=max(p95, MIN_HEDGE_DELAY))
+        tracker.record_request(hedged=not done)
+        if done:
+            return primary.result()
+
+        hedge_model = HEDGE_MODELS.get(model_name, model_name)
+        logger.info(f"Hedging {mode} request: {model_name} exceeded p95 of {p95:.2f}s, sending to {hedge_model}")
+        hedge = self._submit(mode, hedge_model, prompt, generation_config)
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A request that is already running can't be interrupted;
+                    # cancelling just drops it if it hasn't started yet.
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+        return primary.result()
+
+    def warm_up(self) -> None:
+        """Imports the SDK and creates the client of every routed model."""
+        for model_name in set(MODE_MODELS.values()) | set(HEDGE_MODELS.values()):
+            self.get_model(model_name)
+
+    def latency_report(self) -> dict:
+        with self._lock:
+            names = list(self._trackers)
+        return {name: self._tracker(name).p95() for name in names}
+
+
+router = ModelRouter()
@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+from bisect import bisect_right
+from collections import Counter
+
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.fonts import addMapping
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFError
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Directories searched (recursively) for TTF files; the bundled fonts/ dir wins
+FONT_DIRS = os.getenv(
+    "FONT_DIRS",
+    os.pathsep.join([os.path.join(BASE_DIR, "fonts"), "/usr/share/fonts", "/usr/local/share/fonts",
+                     os.path.expanduser("~/.fonts")]),
+).split(os.pathsep)
+DETECT_SAMPLE_CHARS = 4000  # characters looked at when guessing the script
+MIN_SCRIPT_SHARE = 0.1      # share of letters a non-Latin script needs to win
+
+# --- Scripts ---
+# (first code point, last code point, script), sorted by first code point
+SCRIPT_RANGES = sorted([
+    (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"), (0x0750, 0x077F, "arabic"), (0xFB50, 0xFDFF, "arabic"),
+    (0xFE70, 0xFEFF, "arabic"),
+    (0x0900, 0x097F, "devanagari"), (0xA8E0, 0xA8FF, "devanagari"),
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "gurmukhi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B00, 0x0B7F, "oriya"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x0D80, 0x0DFF, "sinhala"),
+    (0x0E00, 0x0E7F, "thai"),
+    (0x1200, 0x139F, "ethiopic"),
+    (0x1C50, 0x1C7F, "ol_chiki"),
+    (0xABC0, 0xABFF, "meetei_mayek"),
+    (0x1100, 0x11FF, "korean"), (0x3130, 0x318F, "korean"), (0xAC00, 0xD7AF, "korean"),
+    (0x3040, 0x30FF, "japanese"),
+    (0x3400, 0x4DBF, "chinese"), (0x4E00, 0x9FFF, "chinese"), (0xF900, 0xFAFF, "chinese"),
+])
+_RANGE_STARTS = [start for start, _, _ in SCRIPT_RANGES]
+
+# Languages whose script can't be told from the text alone (Han is shared by
+# Chinese and Japanese) or that should win even for short mixed-script text
+LANGUAGE_SCRIPTS = {
+    "ja": "japanese", "ko": "korean", "zh-CN": "chinese",
+    "ar": "arabic", "ur": "arabic", "sd": "arabic", "ks": "arabic", "kas": "arabic",
+    "he": "hebrew", "th": "thai", "am": "ethiopic", "si": "sinhala",
+    "bn": "bengali", "as": "bengali", "pa": "gurmukhi", "gu": "gujarati", "or": "oriya",
+    "ta": "tamil", "te": "telugu", "kn": "kannada", "ml": "malayalam", "sat": "ol_chiki",
+    "hi": "devanagari", "mr": "devanagari", "ne": "devanagari", "nep": "devanagari",
+    "sa": "devanagari", "mai": "devanagari", "bho": "devanagari", "kok": "devanagari",
+    "doi": "devanagari", "dgo": "devanagari", "brx": "devanagari", "mag": "devanagari",
+    "hne": "devanagari", "awa": "devanagari", "raj": "devanagari", "mwr": "devanagari",
+    "bgc": "devanagari", "bns": "devanagari", "bgp": "devanagari", "xnr": "devanagari",
+    "kuma": "devanagari", "gbm": "devanagari", "him": "devanagari",
+}
+
+RTL_SCRIPTS = frozenset({"arabic", "hebrew"})
+CJK_SCRIPTS = frozenset({"japanese", "korean", "chinese"})
+# Scripts whose letters join or combine (Arabic, Indic conjuncts, Thai marks,
+# ...) and must be shaped with HarfBuzz to render correctly
+SHAPED_SCRIPTS = frozenset({
+    "hebrew", "arabic", "devanagari", "bengali", "gurmukhi", "gujarati", "oriya", "tamil", "telugu",
+    "kannada", "malayalam", "sinhala", "thai", "ethiopic", "ol_chiki", "meetei_mayek",
+})
+
+# Candidate files per script, best first: (regular, bold, italic, bold italic).
+# Missing variants fall back to the regular face.
+SCRIPT_FONTS = {
+    "latin": [
+        ("NotoSans-Regular.ttf", "NotoSans-Bold.ttf", "NotoSans-Italic.ttf", "NotoSans-BoldItalic.ttf"),
+        ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "DejaVuSans-Oblique.ttf", "DejaVuSans-BoldOblique.ttf"),
+    ],
+    "hebrew": [("NotoSansHebrew-Regular.ttf", "NotoSansHebrew-Bold.ttf")],
+    "arabic": [("NotoNaskhArabic-Regular.ttf", "NotoNaskhArabic-Bold.ttf"),
+               ("NotoSansArabic-Regular.ttf", "NotoSansArabic-Bold.ttf")],
+    "devanagari": [("NotoSansDevanagari-Regular.ttf", "NotoSansDevanagari-Bold.ttf")],
+    "bengali": [("NotoSansBengali-Regular.ttf", "NotoSansBengali-Bold.ttf")],
+    "gurmukhi": [("NotoSansGurmukhi-Regular.ttf", "NotoSansGurmukhi-Bold.ttf")],
+    "gujarati": [("NotoSansGujarati-Regular.ttf", "NotoSansGujarati-Bold.ttf")],
+    "oriya": [("NotoSansOriya-Regular.ttf", "NotoSansOriya-Bold.ttf")],
+    "tamil": [("NotoSansTamil-Regular.ttf", "NotoSansTamil-Bold.ttf")],
+    "telugu": [("NotoSansTelugu-Regular.ttf", "NotoSansTelugu-Bold.ttf")],
+    "kannada": [("NotoSansKannada-Regular.ttf", "NotoSansKannada-Bold.ttf")],
+    "malayalam": [("NotoSansMalayalam-Regular.ttf", "NotoSansMalayalam-Bold.ttf")],
+    "sinhala": [("NotoSansSinhala-Regular.ttf", "NotoSansSinhala-Bold.ttf")],
+    "thai": [("NotoSansThai-Regular.ttf", "NotoSansThai-Bold.ttf")],
+    "ethiopic": [("NotoSansEthiopic-Regular.ttf", "NotoSansEthiopic-Bold.ttf")],
+    "ol_chiki": [("NotoSansOlChiki-Regular.ttf", "NotoSansOlChiki-Bold.ttf")],
+    "meetei_mayek": [("NotoSansMeeteiMayek-Regular.ttf", "NotoSansMeeteiMayek-Bold.ttf")],
+    "japanese": [("NotoSansJP-Regular.ttf", "NotoSansJP-Bold.ttf")],
+    "korean": [("NotoSansKR-Regular.ttf", "NotoSansKR-Bold.ttf")],
+    "chinese": [("NotoSansSC-Regular.ttf", "NotoSansSC-Bold.ttf")],
+}
+
+# ReportLab's built-in faces, used when no TTF is installed for a script
+BUILTIN_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique")
+
+
+def _script_of(char: str) -> str | None:
+    code = ord(char)
+    i = bisect_right(_RANGE_STARTS, code) - 1
+    if i >= 0 and code <= SCRIPT_RANGES[i][1]:
+        return SCRIPT_RANGES[i][2]
+    return None
+
+
+def detect_script(text: str, language: str | None = None) -> str:
+    """
+    Picks the script a text should be typeset in: the language's script if
+    the language is known, otherwise the most common non-Latin script in a
+    sample of the text (kana anywhere makes Han text Japanese).
+    """
+    if language in LANGUAGE_SCRIPTS:
+        return LANGUAGE_SCRIPTS[language]
+    counts = Counter()
+    letters = 0
+    for char in text[:DETECT_SAMPLE_CHARS]:
+        if char.isalpha():
+            letters += 1
+            script = _script_of(char)
+            if script:
+                counts[script] += 1
+    if not counts:
+        return "latin"
+    if counts["japanese"] and counts["chinese"]:
+        counts["japanese"] += counts.pop("chinese")
+    script, count = counts.most_common(1)[0]
+    return script if count >= MIN_SCRIPT_SHARE * letters else "latin"
+
+
+class FontRegistry:
+    """
+    Registers TrueType fonts with ReportLab once per process and hands out
+    the font family and paragraph styles for a script. TTF fonts are embedded
+    as subsets by ReportLab (only the glyphs a document uses), which keeps
+    PDFs with large CJK fonts small. Stylesheets are built once per font and
+    shared; callers must not modify them.
+    """
+
+    def __init__(self, font_dirs: list = FONT_DIRS):
+        self.font_dirs = font_dirs
+        self._files = None  # file name -> path, built on first use
+        self._families = {}  # script -> (regular, bold, italic, bold italic) font names
+        self._styles = {}  # script -> {style key: ParagraphStyle}
+        self._sample = None
+        self._warned = set()  # missing layout features already logged
+        self._lock = threading.RLock()
+
+    def _find_files(self) -> dict:
+        if self._files is None:
+            files = {}
+            for font_dir in self.font_dirs:
+                if not os.path.isdir(font_dir):
+                    continue
+                for root, _, names in os.walk(font_dir):
+                    for name in names:
+                        if name.lower().endswith(".ttf"):
+                            files.setdefault(name, os.path.join(root, name))
+            self._files = files
+        return self._files
+
+    def _register(self, candidates: tuple) -> tuple | None:
+        files = self._find_files()
+        if candidates[0] not in files:
+            return None
+        names = []
+        for filename in candidates + (None,) * (4 - len(candidates)):
+            font_name = os.path.splitext(filename)[0] if filename in files else None
+            if font_name and font_name not in pdfmetrics.getRegisteredFontNames():
+                try:
+                    pdfmetrics.registerFont(TTFont(font_name, files[filename]))
+                except TTFError as e:
+                    logger.warning(f"Could not load font {files[filename]}: {e}")
+                    font_name = None
+            if not names and font_name is None:
+                return None
+            names.append(font_name or names[0])
+        regular, bold, italic, bold_italic = names
+        # Lets <b>/<i> markup inside a Paragraph find the matching face
+        addMapping(regular, 0, 0, regular)
+        addMapping(regular, 1, 0, bold)
+        addMapping(regular, 0, 1, italic)
+        addMapping(regular, 1, 1, bold_italic)
+        logger.info(f"Registered PDF font {regular} from {files[candidates[0]]}")
+        return tuple(names)
+
+    def family(self, script: str) -> tuple:
+        """(regular, bold, italic, bold italic) font names for a script."""
+        with self._lock:
+            family = self._families.get(script)
+            if family is None:
+                for candidates in SCRIPT_FONTS.get(script, []):
+                    family = self._register(candidates)
+                    if family:
+                        break
+                if family is None and script != "latin":
+                    logger.warning(f"No font installed for {script} text, glyphs may be missing")
+                    family = self.family("latin")
+                family = family or BUILTIN_FONTS
+                self._families[script] = family
+            return family
+
+    def _check_layout_support(self, script: str) -> None:
+        """Logs once if ReportLab can't shape or reorder this script's text."""
+        from reportlab.pdfbase.ttfonts import uharfbuzz
+        from reportlab.pdfgen.textobject import rtlSupport
+
+        missing = []
+        if script in SHAPED_SCRIPTS and uharfbuzz is None:
+            missing.append("shaping (pip install 'reportlab[shaping]')")
+        if script in RTL_SCRIPTS and not rtlSupport:
+            missing.append("right-to-left reordering (pip install 'reportlab[bidi]')")
+        for feature in missing:
+            if feature not in self._warned:
+                self._warned.add(feature)
+                logger.warning(f"PDF {feature} is not available, {script} text will render incorrectly")
+
+    def styles(self, script: str) -> dict:
+        """
+        Paragraph styles for a script: 'title', 'summary', 'h1'..'h6',
+        'body' and 'bullet'. Built once per script and cached.
+        """
+        styles = self._styles.get(script)
+        if styles is not None:
+            return styles
+        regular, bold, italic, _ = self.family(script)
+        with self._lock:
+            if self._sample is None:
+                self._sample = getSampleStyleSheet()
+            sample = self._sample
+            self._check_layout_support(script)
+            extra = {}
+            if script in SHAPED_SCRIPTS:
+                extra["shaping"] = 1  # HarfBuzz: joining forms, conjuncts, mark placement
+            if script in RTL_SCRIPTS:
+                extra["alignment"] = TA_RIGHT
+                extra["wordWrap"] = "RTL"  # reorder each wrapped line for display (bidi)
+            if script in CJK_SCRIPTS:
+                extra["wordWrap"] = "CJK"  # break lines between characters, not only at spaces
+
+            def style(key, parent, font_name, **overrides):
+                return ParagraphStyle(f"{key}-{script}", parent=sample[parent], fontName=font_name,
+                                      **{**extra, **overrides})
+
+            styles = {
+                "title": style("title", "h1", bold, alignment=TA_CENTER),
+                "summary": style("summary", "Italic", italic, alignment=TA_CENTER),
+                "body": style("body", "Normal", regular),
+                "bullet": style("bullet", "Bullet", regular),
+            }
+            for level in range(1, 7):
+                styles[f"h{level}"] = style(f"h{level}", f"h{level}", bold)
+            self._styles[script] = styles
+            return styles
+
+    def styles_for_text(self, text: str, language: str | None = None) -> dict:
+        return self.styles(detect_script(text, language))
+
+
+fonts = FontRegistry()
@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_PLAY_SESSIONS = int(os.getenv("MAX_PLAY_SESSIONS", "500"))
+PLAY_IDLE_TIMEOUT = int(os.getenv("PLAY_IDLE_TIMEOUT", str(30 * 60)))  # seconds
+PLAY_TOKEN_BUDGET = int(os.getenv("PLAY_TOKEN_BUDGET", "4000"))  # history tokens sent per turn
+# Compaction keeps the recent turns that fit in this share of the budget, so
+# the history has room to grow for several turns before the next summary call
+COMPACT_TARGET = 0.5
+MIN_RECENT_TURNS = 1  # turns always kept verbatim after compaction
+MAX_ENDED_SESSIONS = 1000  # end reasons remembered, to tell the player why their game is gone
+IDLE, CAPACITY = "idle", "capacity"
+MAX_SUMMARY_CHARS = 1500
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class PlaySession:
+    """One user's running /play game: rolling summary plus the recent turns."""
+
+    __slots__ = ("user_id", "language", "premise", "summary", "turns", "last_active", "turn_count")
+
+    def __init__(self, user_id: int, language: str, premise: str):
+        self.user_id = user_id
+        self.language = language
+        self.premise = premise
+        self.summary = ""
+        self.turns = []  # [(player input, game response)]
+        self.last_active = time.monotonic()
+        self.turn_count = 0
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(
+            estimate_tokens(player) + estimate_tokens(game) for player, game in self.turns
+        )
+
+
+class PlaySessionManager:
+    """
+    Keeps multi-turn /play sessions with a bounded prompt size. Once a
+    session's history passes the token budget, the older turns are folded into
+    a rolling summary, so each turn costs about the same however long the game
+    runs. The number of live sessions is capped and idle ones are evicted;
+    end_reason() tells which of the two happened to a player's session.
+    """
+
+    def __init__(self, max_sessions: int = MAX_PLAY_SESSIONS, idle_timeout: int = PLAY_IDLE_TIMEOUT,
+                 token_budget: int = PLAY_TOKEN_BUDGET):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.token_budget = token_budget
+        self._sessions = OrderedDict()  # user_id -> PlaySession, least recently active first
+        self._ended = OrderedDict()  # user_id -> why their last session was evicted
+        self._lock = threading.Lock()
+
+    def _record_end(self, user_id: int, reason: str) -> None:
+        self._ended[user_id] = reason
+        self._ended.move_to_end(user_id)
+        while len(self._ended) > MAX_ENDED_SESSIONS:
+            self._ended.popitem(last=False)
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.last_active <= self.idle_timeout:
+                break
+            del self._sessions[user_id]
+            self._record_end(user_id, IDLE)
+
+    def start(self, user_id: int, language: str, premise: str) -> PlaySession:
+        """Starts (or restarts) a session, evicting the least active one when full."""
+        with self._lock:
+            self._evict_idle()
+            self._sessions.pop(user_id, None)
+            self._ended.pop(user_id, None)
+            while len(self._sessions) >= self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._record_end(evicted_id, CAPACITY)
+                logger.info(f"Play session limit reached, evicted session of user {evicted_id}")
+            session = PlaySession(user_id, language, premise)
+            self._sessions[user_id] = session
+            return session
+
+    def get(self, user_id: int) -> PlaySession | None:
+        """Returns the user's live session, or None if there is none or it went idle."""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(user_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+                self._sessions.move_to_end(user_id)
+            return session
+
+    def end(self, user_id: int) -> bool:
+        with self._lock:
+            self._ended.pop(user_id, None)
+            return self._sessions.pop(user_id, None) is not None
+
+    def end_reason(self, user_id: int) -> str | None:
+        """IDLE or CAPACITY if the user's last session was evicted, None if unknown (e.g. after a restart)."""
+        with self._lock:
+            self._evict_idle()
+            return self._ended.get(user_id)
+
+    def active_count(self) -> int:
+        with self._lock:
+            self._evict_idle()
+            return len(self._sessions)
+
+    def build_prompt(self, session: PlaySession, player_input: str) -> str:
+        """Prompt for the next turn: premise, rolling summary, recent turns and the new move."""
+        parts = [
+            f"You are running an interactive game in {session.language} that the player started with "
+            f"this request: \"{session.premise}\".",
+        ]
+        if session.summary:
+            parts.append(f"Summary of the story so far:\n{session.summary}")
+        if session.turns:
+            recent = "\n\n".join(f"Player: {player}\nGame: {game}" for player, game in session.turns)
+            parts.append(f"Most recent turns:\n{recent}")
+        parts.append(
+            f"The player now says: \"{player_input}\"\n\n"
+            "Continue the game from here. Keep it concise, stay consistent with the story so far, "
+            "and end with clear numbered choices or a question for the player. Format in Markdown. "
+            "Respond only with the game content."
+        )
+        return "\n\n".join(parts)
+
+    async def record_turn(self, session: PlaySession, player_input: str, response: str, summarize) -> None:
+        """
+        Appends a turn and compacts the history if it is over budget. The
+        compaction keeps as many recent turns as fit in COMPACT_TARGET of the
+        budget, so with normal-length replies it runs every few turns, not on
+        every move. `async summarize(prompt) -> str | None` generates the new
+        rolling summary.
+        """
+        session.turns.append((player_input, response))
+        session.turn_count += 1
+        session.last_active = time.monotonic()
+        if session.history_tokens() <= self.token_budget or len(session.turns) <= MIN_RECENT_TURNS:
+            return
+
+        keep, kept_tokens = 0, 0
+        for player, game in reversed(session.turns):
+            kept_tokens += estimate_tokens(player) + estimate_tokens(game)
+            if keep >= MIN_RECENT_TURNS and kept_tokens > self.token_budget * COMPACT_TARGET:
+                break
+            keep += 1
+        keep = min(keep, len(session.turns) - 1)  # always fold at least one turn
+        older, recent = session.turns[:-keep], session.turns[-keep:]
+        transcript = "\n\n".join(f"Player: {player}\nGame: {game}" for player, game in older)
+        summary = await summarize(
+            f"Summarize this interactive game in {session.language} in at most 150 words. "
+            "Keep character names, items, unresolved choices and the current situation. "
+            "Respond only with the summary.\n\n"
+            f"Earlier summary:\n{session.summary or '(none)'}\n\nTurns to add:\n{transcript}"
+        )
+        if not summary:
+            # Keep the game going even if summarizing failed; fall back to truncating
+            summary = f"{session.summary}\n{transcript}".strip()
+        session.summary = summary.strip()[-MAX_SUMMARY_CHARS:]
+        session.turns = recent
+
+
+play_sessions = PlaySessionManager()
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented limits: ~30 messages/s overall, about one message per
+# second in a single chat and 20 messages per minute in a group.
+GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))       # requests per second, all chats
+PRIVATE_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))    # requests per second, one private chat
+GROUP_CHAT_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+CHAT_BURST = 3                  # requests a quiet chat may send back to back
+MAX_RETRIES = 3                 # RetryAfter requeues before the error reaches the caller
+UPLOAD_MAX_WAIT = 10.0          # seconds after which a queued upload is served like a reply
+MAX_IDLE_BUCKETS = 10000        # per-chat buckets kept before idle ones are pruned
+
+INTERACTIVE, UPLOAD = 0, 1
+UPLOAD_ENDPOINTS = frozenset({
+    "sendDocument", "sendAudio", "sendVoice", "sendPhoto", "sendVideo", "sendAnimation",
+    "sendVideoNote", "sendMediaGroup", "sendSticker",
+})
+# Edits to the same message replace each other while still queued
+EDIT_ENDPOINTS = frozenset({
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia",
+})
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Request:
+    __slots__ = ("callback", "args", "kwargs", "endpoint", "chat_id", "priority", "futures", "queued_at",
+                 "attempts", "edit_key")
+
+    def __init__(self, callback, args, kwargs, endpoint: str, chat_id, priority: int, edit_key):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.endpoint = endpoint
+        self.chat_id = chat_id
+        self.priority = priority
+        self.futures = [asyncio.get_running_loop().create_future()]
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+        self.edit_key = edit_key
+
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Outbound scheduler for every Bot API call that targets a chat. Requests
+    are queued and released within a global and a per-chat token bucket;
+    interactive replies and edits go before uploads. A queued edit to a
+    message is replaced by a newer edit to the same message (both callers get
+    the newer result). On RetryAfter all sending pauses for the requested
+    time and the request is requeued at the front. Calls without a chat
+    (answerCallbackQuery, getMe, ...) are only held back during such a pause.
+    """
+
+    __slots__ = ("global_rate", "max_retries", "_global", "_chats", "_queues", "_edits", "_wakeup",
+                 "_paused_until", "_dispatcher", "_tasks")
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, max_retries: int = MAX_RETRIES):
+        self.global_rate = global_rate
+        self.max_retries = max_retries
+        self._global = _TokenBucket(global_rate, global_rate)
+        self._chats = {}  # chat id -> _TokenBucket
+        self._queues = (deque(), deque())  # by priority
+        self._edits = {}  # (endpoint, chat id, message id) -> queued _Request
+        self._wakeup = None
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self._tasks = set()
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self._queues:
+            while queue:
+                for future in queue.popleft().futures:
+                    if not future.done():
+                        future.cancel()
+        self._edits.clear()
+
+    # --- Queueing ---
+    def _chat_bucket(self, chat_id) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_BUCKETS:
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_full(now)}
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = _TokenBucket(PRIVATE_CHAT_RATE if private else GROUP_CHAT_RATE, CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _enqueue(self, request: _Request, front: bool = False) -> None:
+        queue = self._queues[request.priority]
+        if front:
+            queue.appendleft(request)
+        else:
+            queue.append(request)
+        if request.edit_key is not None:
+            self._edits[request.edit_key] = request
+        self._wakeup.set()
+
+    def _next_ready(self, now: float) -> tuple[_Request | None, float]:
+        """
+        Picks the first queued request whose chat may send now, interactive
+        before uploads (unless an upload has waited too long). Returns it, or
+        None and the seconds until some chat frees up.
+        """
+        interactive, uploads = self._queues
+        order = [interactive, uploads]
+        if uploads and now - uploads[0].queued_at > UPLOAD_MAX_WAIT:
+            order.reverse()
+        wait = None
+        blocked = set()
+        for queue in order:
+            for request in queue:
+                if request.chat_id in blocked:
+                    continue
+                delay = self._chat_bucket(request.chat_id).delay(now)
+                if delay == 0:
+                    queue.remove(request)
+                    if request.edit_key is not None and self._edits.get(request.edit_key) is request:
+                        del self._edits[request.edit_key]
+                    return request, 0.0
+                blocked.add(request.chat_id)
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _dispatch(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            delay = self._global.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            request, wait = self._next_ready(now)
+            if request is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._global.take(now)
+            self._chat_bucket(request.chat_id).take(now)
+            task = asyncio.create_task(self._send(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, request: _Request) -> None:
+        request.attempts += 1
+        try:
+            result = await request.callback(*request.args, **request.kwargs)
+        except RetryAfter as e:
+            if request.attempts > self.max_retries:
+                self._resolve(request, error=e)
+                return
+            retry_after = e.retry_after
+            if hasattr(retry_after, "total_seconds"):  # timedelta in newer python-telegram-bot
+                retry_after = retry_after.total_seconds()
+            logger.warning(f"Flood limit hit on {request.endpoint} for chat {request.chat_id}, "
+                           f"pausing sends for {retry_after}s")
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._enqueue(request, front=True)
+        except Exception as e:
+            self._resolve(request, error=e)
+        else:
+            self._resolve(request, result=result)
+
+    @staticmethod
+    def _resolve(request: _Request, result=None, error: Exception | None = None) -> None:
+        for future in request.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # --- BaseRateLimiter ---
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+            return await callback(*args, **kwargs)
+
+        edit_key = None
+        if endpoint in EDIT_ENDPOINTS and data.get("message_id") is not None:
+            edit_key = (endpoint, chat_id, data["message_id"])
+            queued = self._edits.get(edit_key)
+            if queued is not None:
+                # Keep the queued slot, send the newer content
+                queued.callback, queued.args, queued.kwargs = callback, args, kwargs
+                future = asyncio.get_running_loop().create_future()
+                queued.futures.append(future)
+                return await future
+
+        priority = UPLOAD if endpoint in UPLOAD_ENDPOINTS else INTERACTIVE
+        if isinstance(rate_limit_args, dict) and rate_limit_args.get("priority") in (INTERACTIVE, UPLOAD):
+            priority = rate_limit_args["priority"]
+        request = _Request(callback, args, kwargs, endpoint, chat_id, priority, edit_key)
+        self._enqueue(request)
+        return await request.futures[0]
+
+    def stats(self) -> dict:
+        interactive, uploads = self._queues
+        return {"queued_interactive": len(interactive), "queued_uploads": len(uploads),
+                "in_flight": len(self._tasks), "paused_for": max(0.0, self._paused_until - time.monotonic())}
@@ -0,0 +1,126 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from copy import deepcopy
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_PATH = os.getenv("BOT_STATE_DB", "bot_state.sqlite3")
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Persistence backed by a local SQLite file, so a user's conversation state
+    and last_content handle survive a worker restart. This is not a live store
+    shared between workers: each user's user_data is owned by the one worker
+    whose shard the user maps to (see workers.shard_for_update) and is only
+    read back when a worker starts. chat_data and bot_data are not used by
+    the handlers and are not stored, since every worker would overwrite them.
+    Writes are flushed every `update_interval` seconds and on shutdown.
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH, update_interval: float = 1):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (kind, key))"
+        )
+
+    # --- Low-level helpers ---
+    def _load(self, kind: str, key) -> object | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE kind = ? AND key = ?", (kind, str(key))
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _load_all(self, kind: str) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM state WHERE kind = ?", (kind,)).fetchall()
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _store(self, kind: str, key, value) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (kind, key, value) VALUES (?, ?, ?)", (kind, str(key), blob)
+            )
+
+    def _delete(self, kind: str, key) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE kind = ? AND key = ?", (kind, str(key)))
+
+    # --- User / chat / bot data ---
+    async def get_user_data(self) -> dict:
+        return {int(key): value for key, value in self._load_all("user").items()}
+
+    async def get_chat_data(self) -> dict:
+        return {int(key): value for key, value in self._load_all("chat").items()}
+
+    async def get_bot_data(self) -> dict:
+        return self._load("bot", "bot") or {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._store("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._store("chat", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._store("bot", "bot", data)
+
+    # These are no-ops only because updates are sharded by user: a user's
+    # user_data is written solely by the worker that owns the shard, and a
+    # replacement worker loads it in get_user_data() on start, so the
+    # in-memory copy is always the newest one. If the sharding key changes
+    # (e.g. back to chat_id), refresh_user_data must re-read from SQLite.
+    # chat_data and bot_data aren't stored (see the class docstring).
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._delete("user", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._delete("chat", chat_id)
+
+    # --- Conversations / callback data (not used by the bot, kept for completeness) ---
+    async def get_conversations(self, name: str) -> dict:
+        return deepcopy(self._load("conversation", name) or {})
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        conversations = self._load("conversation", name) or {}
+        if new_state is None:
+            conversations.pop(key, None)
+        else:
+            conversations[key] = new_state
+        self._store("conversation", name, conversations)
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE_PATH = os.getenv("STARTUP_PROFILE_PATH", "startup_profile.jsonl")
+# Heroku sets HEROKU_RELEASE_VERSION with the dyno metadata feature, SOURCE_VERSION at build time
+RELEASE = os.getenv("HEROKU_RELEASE_VERSION") or os.getenv("SOURCE_VERSION") or "local"
+MAX_HISTORY = 50  # reports kept in the profile file
+REPORT_AFTER = ("warm-up done",)  # milestones that complete a cold start
+# Milestones that may only come later (or never, on a quiet deploy); they are
+# added to the report when they happen
+LATE_MILESTONES = ("first update",)
+
+_PROCESS_START = time.perf_counter()  # as early as bot.py can import us
+
+
+def _same_report(line: str, record: dict) -> bool:
+    try:
+        saved = json.loads(line)
+    except json.JSONDecodeError:
+        return False
+    return all(saved.get(key) == record[key] for key in ("release", "pid", "ts"))
+
+
+class StartupProfile:
+    """
+    Times the phases of a cold start (imports, setup, warm-up) and the
+    milestones after it (polling started, first update received). The report
+    is logged once the warm-up is done, and appended to a local JSON-lines
+    file keyed by release, so a change in import time between two deploys
+    shows up next to the previous release's numbers. The first update may
+    come much later or not at all; it is added to the saved report when it
+    arrives.
+    """
+
+    def __init__(self, path: str | None = None, release: str = RELEASE):
+        self.path = path
+        self.release = release
+        self.phases = {}  # phase -> seconds spent in it
+        self.milestones = {}  # milestone -> seconds since process start
+        self._lock = threading.Lock()
+        self._reported = False
+        self._record = None  # the saved report, amended with late milestones
+        self._previous_record = None  # the previous release's report, for deltas
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def init(self, path: str = STARTUP_PROFILE_PATH) -> None:
+        """
+        Sets the profile file. Like the job journal, this is done by the
+        process that serves updates rather than at import, so each worker
+        writes its own file; until then nothing is written.
+        """
+        self.path = path
+
+    def mark(self, name: str) -> None:
+        """
+        Records a milestone once, as seconds since the process started, and
+        reports once every milestone in REPORT_AFTER has been reached.
+        """
+        with self._lock:
+            if name in self.milestones:
+                return
+            self.milestones[name] = time.perf_counter() - _PROCESS_START
+            complete = all(milestone in self.milestones for milestone in REPORT_AFTER)
+            late = self._reported and name in LATE_MILESTONES
+        if late:
+            self._amend(name)
+        elif complete:
+            self.report()
+
+    def _previous(self) -> dict | None:
+        """The most recent report of a different release."""
+        if not os.path.exists(self.path):
+            return None
+        previous = None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("release") != self.release:
+                    previous = record
+        return previous
+
+    def _save(self, record: dict, replace: bool = False) -> None:
+        """Appends the record, or replaces this process's earlier version of it."""
+        lines = []
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()[-(MAX_HISTORY - 1):]
+        if replace:
+            lines = [line for line in lines if not _same_report(line, record)]
+        lines.append(json.dumps(record) + "\n")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+    def report(self) -> dict | None:
+        """Logs the profile and appends it to the profile file (once per process)."""
+        with self._lock:
+            if self._reported or self.path is None:
+                return None
+            self._reported = True
+            record = {"release": self.release, "ts": time.time(), "pid": os.getpid(),
+                      "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+                      "milestones": {name: round(seconds, 4) for name, seconds in self.milestones.items()}}
+
+        try:
+            previous = self._previous()
+            self._save(record)
+        except OSError as e:
+            logger.warning(f"Could not write startup profile {self.path}: {e}")
+            previous = None
+        with self._lock:
+            self._record, self._previous_record = record, previous
+
+        lines = [f"Startup profile for release {self.release}:"]
+        for kind in ("phases", "milestones"):
+            for name, seconds in record[kind].items():
+                lines.append(self._format_line(kind, name, seconds))
+        logger.info("\n".join(lines))
+        return record
+
+    def _format_line(self, kind: str, name: str, seconds: float) -> str:
+        line = f"  {name:<28} {seconds * 1000:9.1f} ms"
+        previous = self._previous_record
+        before = previous.get(kind, {}).get(name) if previous else None
+        if before is not None:
+            line += f"  ({(seconds - before) * 1000:+.1f} ms vs release {previous['release']})"
+        return line
+
+    def _amend(self, name: str) -> None:
+        """Adds a milestone reached after the report to the saved report."""
+        with self._lock:
+            if self._record is None:
+                return
+            seconds = round(self.milestones[name], 4)
+            self._record["milestones"][name] = seconds
+            record = json.loads(json.dumps(self._record))
+        try:
+            self._save(record, replace=True)
+        except OSError as e:
+            logger.warning(f"Could not update startup profile {self.path}: {e}")
+        logger.info(f"Startup profile for release {self.release}, after the report:\n"
+                    + self._format_line("milestones", name, seconds))
+
+
+profile = StartupProfile()
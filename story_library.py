@@ -0,0 +1,260 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORY_CONTENT_DIR = os.path.join(BASE_DIR, "story_content")
+STORY_PDFS_DIR = os.path.join(BASE_DIR, "story_pdfs")
+REFRESH_INTERVAL = 60  # seconds between checks for changed files
+
+CHAPTER_RE = re.compile(r'^chapter_(\d+)_(.+)$')
+FINAL_CHAPTER_RE = re.compile(r'^final_chapter_(.+)$')
+WORD_RE = re.compile(r"[^\W\d_][\w'’-]*", re.UNICODE)
+NAME_RE = re.compile(r"\b[A-Z][a-z]{2,}\b")
+MIN_TOKEN_LENGTH = 3
+FINAL_CHAPTER = 10 ** 6  # sorts final chapters after every numbered one
+VOCABULARY_WEIGHT = 20
+PDF_WEIGHT = 5
+KEY_LENGTH = 12  # hex digits; keeps `library_<key>` well inside Telegram's 64-byte callback_data
+
+STOPWORDS = frozenset("""
+the and for that with was his her she him you your they them their this from have had but not are were
+been into its all out one who what when which there then than some like over just only more very would
+could about upon onto also each other through while where before after again never ever every here
+""".split())
+
+
+def _tokenize(text: str) -> list:
+    return [word for word in (w.lower().strip("'’-") for w in WORD_RE.findall(text))
+            if len(word) >= MIN_TOKEN_LENGTH and word not in STOPWORDS]
+
+
+class LibraryEntry:
+    """One pre-built story or chapter from story_content/."""
+
+    __slots__ = ("id", "key", "title", "chapter", "text_path", "pdf_path", "mtime", "names", "series_id")
+
+    def __init__(self, entry_id: str, title: str, chapter: int | None, text_path: str, mtime: float,
+                 names: Counter):
+        self.id = entry_id
+        # Short, stable stand-in for the file stem in button callback data
+        self.key = hashlib.sha1(entry_id.encode('utf-8')).hexdigest()[:KEY_LENGTH]
+        self.title = title
+        self.chapter = chapter
+        self.text_path = text_path
+        self.pdf_path = None
+        self.mtime = mtime
+        self.names = names
+        self.series_id = entry_id
+
+    def read_text(self) -> str:
+        with open(self.text_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+
+def _title_from_stem(stem: str) -> tuple[str, int | None]:
+    chapter_match = CHAPTER_RE.match(stem)
+    if chapter_match:
+        number = int(chapter_match.group(1))
+        return f"Chapter {number}: {chapter_match.group(2).replace('_', ' ').title()}", number
+    final_match = FINAL_CHAPTER_RE.match(stem)
+    if final_match:
+        return f"Final Chapter: {final_match.group(1).replace('_', ' ').title()}", FINAL_CHAPTER
+    return stem.replace('_', ' ').title(), None
+
+
+class StoryLibrary:
+    """
+    Index over the finished stories in story_content/ and their pre-rendered
+    PDFs in story_pdfs/. Holds titles, chapter order, series grouping and a
+    small inverted keyword index; files are re-indexed only when they change.
+    """
+
+    def __init__(self, content_dir: str = STORY_CONTENT_DIR, pdf_dir: str = STORY_PDFS_DIR):
+        self.content_dir = content_dir
+        self.pdf_dir = pdf_dir
+        self.entries = {}
+        self.series = {}  # series id -> [entry ids in chapter order]
+        self._index = defaultdict(set)  # token -> entry ids
+        self._tokens = {}  # entry id -> tokens, to unindex on change
+        self._keys = {}  # entry key -> entry id
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0  # indexed on first use, or by the start-up warm-up
+
+    # --- Indexing ---
+    def _index_entry(self, stem: str, path: str, mtime: float) -> None:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        title, chapter = _title_from_stem(stem)
+        # Prefer the file's own heading ("Chapter 1: The Beginning", "**The Martian Echo**")
+        raw_first_line = text.strip().split('\n', 1)[0].strip()
+        first_line = raw_first_line.strip('*#_ ')
+        if chapter is not None and chapter != FINAL_CHAPTER and first_line.startswith(f"Chapter {chapter}:"):
+            title = first_line
+        elif chapter is None and raw_first_line.startswith(('**', '#')) and len(first_line.split()) <= 8:
+            title = first_line
+
+        tokens = set(_tokenize(text)) | set(_tokenize(title))
+        # Proper names: capitalised words that never appear in lower case
+        lowercase_words = set(WORD_RE.findall(text.lower())) & set(WORD_RE.findall(text))
+        names = Counter(name for name in NAME_RE.findall(text) if name.lower() not in lowercase_words)
+        entry = LibraryEntry(stem, title, chapter, path, mtime, names)
+        self._unindex_entry(stem)
+        self.entries[stem] = entry
+        self._keys[entry.key] = stem
+        self._tokens[stem] = tokens
+        for token in tokens:
+            self._index[token].add(stem)
+
+    def _unindex_entry(self, stem: str) -> None:
+        for token in self._tokens.pop(stem, ()):
+            ids = self._index.get(token)
+            if ids is not None:
+                ids.discard(stem)
+                if not ids:
+                    del self._index[token]
+        entry = self.entries.pop(stem, None)
+        if entry is not None:
+            self._keys.pop(entry.key, None)
+
+    def _similarity(self, a: LibraryEntry, b: LibraryEntry) -> float:
+        # Shared names dominate; vocabulary overlap and having been rendered to
+        # PDF together separate chapters that mention few names
+        tokens_a, tokens_b = self._tokens[a.id], self._tokens[b.id]
+        jaccard = len(tokens_a & tokens_b) / (len(tokens_a | tokens_b) or 1)
+        score = sum((a.names & b.names).values()) + VOCABULARY_WEIGHT * jaccard
+        if (a.pdf_path is None) == (b.pdf_path is None):
+            score += PDF_WEIGHT
+        return score
+
+    def _group_series(self) -> None:
+        """
+        Chains chapters into series. Each chapter N+1 is matched to the series
+        ending in the most similar chapter N (shared character/place names,
+        then vocabulary; best pairs first); an unmatched chapter or a
+        standalone story starts a new series.
+        """
+        series = {}
+        by_chapter = defaultdict(list)
+        for entry in sorted(self.entries.values(), key=lambda e: e.id):
+            if entry.chapter is None:
+                entry.series_id = entry.id
+                series[entry.id] = [entry.id]
+            else:
+                by_chapter[entry.chapter].append(entry)
+
+        for number in sorted(by_chapter):
+            candidates = []
+            for entry in by_chapter[number]:
+                for series_id, members in series.items():
+                    last = self.entries[members[-1]]
+                    if last.chapter is None or last.chapter >= number:
+                        continue
+                    if number != FINAL_CHAPTER and last.chapter != number - 1:
+                        continue
+                    score = self._similarity(entry, last)
+                    if score:
+                        candidates.append((score, entry.id, series_id))
+
+            assigned, extended = set(), set()
+            for score, entry_id, series_id in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+                if entry_id in assigned or series_id in extended:
+                    continue
+                self.entries[entry_id].series_id = series_id
+                series[series_id].append(entry_id)
+                assigned.add(entry_id)
+                extended.add(series_id)
+            for entry in by_chapter[number]:
+                if entry.id not in assigned:
+                    entry.series_id = entry.id
+                    series[entry.id] = [entry.id]
+        self.series = series
+
+    def _attach_pdfs(self) -> None:
+        pdfs = set()
+        if os.path.isdir(self.pdf_dir):
+            pdfs = {name[:-4] for name in os.listdir(self.pdf_dir) if name.endswith(".pdf")}
+        for entry in self.entries.values():
+            entry.pdf_path = os.path.join(self.pdf_dir, f"{entry.id}.pdf") if entry.id in pdfs else None
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-indexes added, changed or removed files. Cheap when nothing changed
+        (one directory scan), and rate-limited unless `force` is set.
+        Returns True if the index changed.
+        """
+        now = time.time()
+        if not force and now - self._last_refresh < REFRESH_INTERVAL:
+            return False
+        with self._lock:
+            self._last_refresh = now
+            seen = {}
+            if os.path.isdir(self.content_dir):
+                for dir_entry in os.scandir(self.content_dir):
+                    if dir_entry.is_file() and dir_entry.name.endswith(".txt"):
+                        seen[dir_entry.name[:-4]] = (dir_entry.path, dir_entry.stat().st_mtime)
+
+            changed = False
+            for stem in [stem for stem in self.entries if stem not in seen]:
+                self._unindex_entry(stem)
+                changed = True
+            for stem, (path, mtime) in seen.items():
+                entry = self.entries.get(stem)
+                if entry is None or entry.mtime != mtime:
+                    try:
+                        self._index_entry(stem, path, mtime)
+                    except (OSError, UnicodeDecodeError) as e:
+                        logger.error(f"Could not index library file {path}: {e}")
+                        continue
+                    changed = True
+
+            pdfs_before = {entry.id: entry.pdf_path for entry in self.entries.values()}
+            self._attach_pdfs()
+            if pdfs_before != {entry.id: entry.pdf_path for entry in self.entries.values()}:
+                changed = True
+            if changed:
+                self._group_series()
+                logger.info(f"Story library indexed: {len(self.entries)} stories in {len(self.series)} series")
+            return changed
+
+    # --- Queries ---
+    def get(self, entry_id: str) -> LibraryEntry | None:
+        self.refresh()
+        return self.entries.get(entry_id)
+
+    def get_by_key(self, key: str) -> LibraryEntry | None:
+        """Looks an entry up by its short key (see LibraryEntry.key)."""
+        self.refresh()
+        entry_id = self._keys.get(key)
+        return self.entries.get(entry_id) if entry_id is not None else None
+
+    def list_series(self) -> list:
+        """Returns [(series title, [entries in chapter order])], longest series first."""
+        self.refresh()
+        with self._lock:
+            result = []
+            for series_id, members in self.series.items():
+                entries = [self.entries[member] for member in members]
+                head = entries[0].title.split(": ", 1)[-1]
+                result.append((head, entries))
+        return sorted(result, key=lambda item: (-len(item[1]), item[0]))
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Ranks entries by how many of the query's keywords they contain."""
+        self.refresh()
+        scores = Counter()
+        with self._lock:
+            for token in set(_tokenize(query)):
+                for entry_id in self._index.get(token, ()):
+                    scores[entry_id] += 1
+            return [self.entries[entry_id] for entry_id, _ in
+                    sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+
+library = StoryLibrary()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "256"))
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates of different users concurrently, so one user's slow
+    generation doesn't hold up every other chat, while a single user's
+    updates still run one at a time and in order (their conversation state
+    in user_data depends on it). Updates without a user are keyed by chat.
+    An update waiting behind its user's previous one counts toward
+    `max_concurrent_updates`, hence the generous default.
+    """
+
+    __slots__ = ("_locks",)
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # user (or chat) id -> [asyncio.Lock, updates holding or waiting for it]
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self._key(update)
+        if key is None:
+            await coroutine
+            return
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                await coroutine
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,114 @@
+import json
+
+# --- WebApp job protocol ---
+# index.html submits a complete job in a single `web_app_data` payload instead
+# of walking through the language / length / tone / prompt buttons:
+#
+#   {"v": 1, "mode": "story", "language": "en", "length": "short", "prompt": "..."}
+#   {"v": 1, "mode": "ebook", "language": "fr", "prompt": "..."}
+#   {"v": 1, "mode": "writer", "language": "en", "tone": "funny", "prompt": "..."}
+#   {"v": 1, "mode": "play", "language": "en", "prompt": "..."}
+#   {"v": 1, "mode": "speak", "voice": "female", "age": 30, "prompt": "..."}
+#
+# A job is turned into the same user_data state the button flow would have
+# produced, so the regular handle_message path runs it.
+
+PROTOCOL_VERSION = 1
+MAX_PROMPT_LENGTH = 2000
+MAX_PAYLOAD_LENGTH = 4096  # Telegram's own limit for web_app_data, in UTF-8 bytes
+
+MODES = ("story", "ebook", "writer", "play", "speak")
+STORY_LENGTHS = ("short", "medium", "long")
+WRITER_TONES = ("funny", "serious", "fantasy")
+VOICES = ("male", "female")
+
+# State handle_message expects for each mode
+MODE_STATES = {
+    "story": "waiting_for_detailed_story_prompt",
+    "ebook": "waiting_for_ebook_topic",
+    "writer": "waiting_for_writer_topic",
+    "play": "waiting_for_play_prompt",
+    "speak": "waiting_for_tts_text",
+}
+
+
+class WebAppJobError(ValueError):
+    """Raised when a WebApp payload is not a valid job."""
+
+
+class WebAppJob:
+    """A validated job submitted from the WebApp."""
+
+    __slots__ = ("mode", "prompt", "language", "length", "tone", "voice", "age")
+
+    def __init__(self, mode: str, prompt: str, language: str = "en", length: str | None = None,
+                 tone: str | None = None, voice: str | None = None, age: int | None = None):
+        self.mode = mode
+        self.prompt = prompt
+        self.language = language
+        self.length = length
+        self.tone = tone
+        self.voice = voice
+        self.age = age
+
+    def user_data(self) -> dict:
+        """The user_data entries the button flow would have set for this job."""
+        data = {'state': MODE_STATES[self.mode]}
+        if self.mode == "speak":
+            data['tts_voice'] = self.voice
+            data['tts_age'] = self.age
+        else:
+            data['selected_language'] = self.language
+        if self.mode == "story":
+            data['story_length'] = self.length
+        elif self.mode == "writer":
+            data['writer_tone'] = self.tone
+        return data
+
+
+def _choice(payload: dict, key: str, choices: tuple, default: str | None = None) -> str:
+    value = payload.get(key, default)
+    if value not in choices:
+        raise WebAppJobError(f"'{key}' must be one of: {', '.join(choices)}")
+    return value
+
+
+def parse_job(raw: str, languages) -> WebAppJob:
+    """
+    Validates a raw web_app_data payload and returns the job.
+    `languages` is the collection of accepted language codes.
+    """
+    if len(raw.encode('utf-8')) > MAX_PAYLOAD_LENGTH:
+        raise WebAppJobError("Payload is too large")
+    try:
+        payload = json.loads(raw)
+    except json.JSONDecodeError:
+        raise WebAppJobError("Payload is not valid JSON")
+    if not isinstance(payload, dict):
+        raise WebAppJobError("Payload must be a JSON object")
+
+    version = payload.get("v")
+    if version != PROTOCOL_VERSION:
+        raise WebAppJobError(f"Unsupported protocol version {version!r}, expected {PROTOCOL_VERSION}")
+
+    mode = _choice(payload, "mode", MODES)
+    prompt = payload.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise WebAppJobError("'prompt' is required")
+    prompt = prompt.strip()
+    if len(prompt) > MAX_PROMPT_LENGTH:
+        raise WebAppJobError(f"'prompt' must be at most {MAX_PROMPT_LENGTH} characters")
+
+    if mode == "speak":
+        voice = _choice(payload, "voice", VOICES)
+        age = payload.get("age")
+        if age is not None and (isinstance(age, bool) or not isinstance(age, int) or not 1 <= age <= 120):
+            raise WebAppJobError("'age' must be a whole number between 1 and 120")
+        return WebAppJob(mode, prompt, voice=voice, age=age)
+
+    language = payload.get("language", "en")
+    if language not in languages:
+        raise WebAppJobError(f"Unsupported language {language!r}")
+    length = _choice(payload, "length", STORY_LENGTHS, "short") if mode == "story" else None
+    tone = _choice(payload, "tone", WRITER_TONES) if mode == "writer" else None
+    return WebAppJob(mode, prompt, language=language, length=length, tone=tone)
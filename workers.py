@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from telegram import Bot, Update
+from telegram.error import Conflict, NetworkError, TimedOut
+
+from config import TELEGRAM_BOT_TOKEN
+from log_pipeline import setup_logging
+
+logger = logging.getLogger(__name__)
+
+NUM_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+POLL_TIMEOUT = 30              # long-polling timeout for getUpdates, seconds
+WORKER_CHECK_INTERVAL = 1.0    # how often the ingress checks worker liveness
+RESTART_BACKOFF_BASE = 1.0     # seconds before restarting a worker that crashed again soon after a restart...
+RESTART_BACKOFF_MAX = 60.0     # ...doubling per further crash up to this
+WORKER_HEALTHY_AFTER = 60.0    # a worker that ran this long resets its shard's backoff
+QUEUE_GET_TIMEOUT = 1.0        # how often an idle worker checks whether it should stop
+WORKER_STOP_TIMEOUT = 30       # covers the workers' drain grace period
+
+
+def shard_for_update(data: dict, num_workers: int) -> int:
+    """
+    Maps a raw update to a worker. Updates are sharded by sender so that all
+    of a user's updates are handled, in order, by the same worker: user_data
+    (conversation state, last_content) is keyed by user, and a user active in
+    a group and a private chat must not have it written by two workers. In
+    private chats the sender is the chat, so per-chat order holds there too.
+    """
+    for value in data.values():
+        if isinstance(value, dict) and "from" in value:
+            return value["from"]["id"] % num_workers
+    # Updates without a sender (channel posts, ...) are keyed by chat.
+    for value in data.values():
+        if isinstance(value, dict) and isinstance(value.get("chat"), dict):
+            return value["chat"]["id"] % num_workers
+    return 0
+
+
+# --- Worker side ---
+def _shard_path(path: str, shard: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}_{shard}{ext}"
+
+
+async def _run_worker(shard: int, update_queue) -> None:
+    from telegram.ext import Application
+    from bot import register_handlers, notify_interrupted_jobs, warm_up
+    from content_store import content_store
+    from job_journal import job_journal, JOB_JOURNAL_PATH
+    from startup_profile import profile, STARTUP_PROFILE_PATH
+    from shared_state import SqlitePersistence
+    from send_scheduler import SendScheduler, GLOBAL_RATE
+    from update_processor import UserOrderedUpdateProcessor
+
+    # Each shard keeps its own journal (so a restarted worker resumes only its
+    # users' jobs) and its own start-up profile
+    job_journal.init(_shard_path(JOB_JOURNAL_PATH, shard))
+    profile.init(_shard_path(STARTUP_PROFILE_PATH, shard))
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .updater(None)
+        .persistence(SqlitePersistence())
+        # The bot-wide limit is split between workers. A private chat is always served by one
+        # worker, so its per-chat limit holds; a group's may be shared by several.
+        .rate_limiter(SendScheduler(global_rate=GLOBAL_RATE / NUM_WORKERS))
+        .concurrent_updates(UserOrderedUpdateProcessor())
+        .build()
+    )
+    register_handlers(application)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    async with application:
+        await application.start()
+        logger.info(f"Worker {shard} (pid {os.getpid()}) ready")
+        await notify_interrupted_jobs(application)
+        loop.run_in_executor(None, warm_up)
+        while not stopping.is_set():
+            try:
+                data = await asyncio.to_thread(update_queue.get, True, QUEUE_GET_TIMEOUT)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        # Updates still queued are journaled but not started; in-flight jobs get the grace period
+        job_journal.begin_drain()
+        await job_journal.wait_idle()
+        await application.stop()
+    job_journal.close()
+    content_store.flush()
+
+
+def worker_main(shard: int, update_queue) -> None:
+    setup_logging(f'%(asctime)s - worker-{shard} - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_run_worker(shard, update_queue))
+
+
+# --- Ingress side ---
+class Ingress:
+    """
+    Single process that polls Telegram and fans updates out to worker
+    processes. Each shard owns a queue; when a worker dies a new one is started
+    on the same queue, so the shard (and any updates still queued for it) is
+    picked up without loss. Liveness is checked on its own timer, not between
+    long-polls; a worker that keeps crashing is restarted with exponential
+    backoff.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self.queues = [self._ctx.Queue() for _ in range(num_workers)]
+        self.processes = [None] * num_workers
+        self._started_at = [0.0] * num_workers
+        self._crashes = [0] * num_workers  # consecutive short-lived runs per shard
+        self._restart_at = [None] * num_workers  # monotonic time of a scheduled restart
+
+    def _start_worker(self, shard: int) -> None:
+        process = self._ctx.Process(
+            target=worker_main, args=(shard, self.queues[shard]), name=f"bot-worker-{shard}", daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+        self._started_at[shard] = time.monotonic()
+        self._restart_at[shard] = None
+
+    def check_workers(self) -> None:
+        now = time.monotonic()
+        for shard, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                continue
+            if process is not None and self._restart_at[shard] is None:
+                if now - self._started_at[shard] >= WORKER_HEALTHY_AFTER:
+                    self._crashes[shard] = 0
+                self._crashes[shard] += 1
+                # An occasional crash is restarted at once, repeated ones after 1s, 2s, 4s, ...
+                crashes = self._crashes[shard]
+                delay = 0.0 if crashes == 1 else min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * 2 ** (crashes - 2))
+                self._restart_at[shard] = now + delay
+                logger.warning(f"Worker {shard} exited with code {process.exitcode}, "
+                               f"restarting its shard in {delay:.0f}s")
+            if self._restart_at[shard] is None or now >= self._restart_at[shard]:
+                self._start_worker(shard)
+
+    async def _supervise(self) -> None:
+        while True:
+            self.check_workers()
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+
+    def dispatch(self, data: dict) -> None:
+        self.queues[shard_for_update(data, self.num_workers)].put(data)
+
+    async def _poll(self) -> None:
+        bot = Bot(TELEGRAM_BOT_TOKEN)
+        offset = None
+        loop = asyncio.get_running_loop()
+        # On a redeploy Heroku sends SIGTERM: stop polling at once (get_updates
+        # may be mid long-poll) so run() can stop the workers and they can drain
+        main_task = asyncio.current_task()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, main_task.cancel)
+        supervisor = asyncio.create_task(self._supervise())
+        async with bot:
+            try:
+                while True:
+                    try:
+                        updates = await bot.get_updates(
+                            offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                        )
+                    except Conflict:
+                        logger.error("Another instance is polling with this token; only one ingress may run")
+                        raise
+                    except (TimedOut, NetworkError) as e:
+                        logger.warning(f"Polling error, retrying: {e}")
+                        await asyncio.sleep(1)
+                        continue
+                    for update in updates:
+                        self.dispatch(update.to_dict())
+                        offset = update.update_id + 1
+            except asyncio.CancelledError:
+                logger.info("Ingress stopping")
+                if offset is not None:
+                    # Confirm the updates already dispatched so they aren't delivered again
+                    # after the restart (anything this returns stays unconfirmed)
+                    try:
+                        await bot.get_updates(offset=offset, timeout=0, limit=1)
+                    except Exception as e:
+                        logger.warning(f"Could not confirm the last updates: {e}")
+            finally:
+                supervisor.cancel()
+
+    def stop(self) -> None:
+        for shard_queue in self.queues:
+            try:
+                shard_queue.put_nowait(None)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=WORKER_STOP_TIMEOUT)
+
+    def run(self) -> None:
+        self.check_workers()
+        try:
+            asyncio.run(self._poll())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def run_ingress(num_workers: int = NUM_WORKERS) -> None:
+    """Start the bot in multi-worker mode."""
+    logger.info(f"Bot starting with {num_workers} worker processes...")
+    Ingress(num_workers).run()